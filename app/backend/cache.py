@@ -0,0 +1,168 @@
+'''Серверный кэш отрендеренных страниц.
+Страницы каталога и блога меняются только когда администратор редактирует данные, поэтому готовый HTML
+сохраняется в кэше и отдается без запросов к базе и рендеринга шаблона.
+- ключ: тег + адрес страницы + отсортированные параметры запроса;
+- инвалидация: у каждого тега ("store", "posts") есть номер поколения, входящий в ключ.
+  Админка увеличивает номер, и все старые записи тега перестают находиться (и вытесняются по LRU/TTL);
+- ETag: по содержимому страницы, на If-None-Match с тем же значением отвечаем 304 без тела.
+Хранилище по умолчанию - LRU в памяти процесса (MemoryCache). Для нескольких воркеров можно подключить
+общее хранилище (RedisCache, CACHE_URL=redis://...), номера поколений тогда тоже общие.'''
+
+import functools
+import hashlib
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+
+
+# Базовый интерфейс хранилища: все методы асинхронные, чтобы подходили и сетевые хранилища
+class CacheBackend:
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    async def get_counter(self, key: str) -> int:
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._data: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._counters: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    async def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+
+# Общее хранилище для нескольких процессов (нужен пакет redis)
+class RedisCache(CacheBackend):
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        import pickle
+
+        raw = await self._redis.get(key)
+        return pickle.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        import pickle
+
+        await self._redis.set(key, pickle.dumps(value), px=int(ttl * 1000))
+
+    async def incr(self, key: str) -> int:
+        return await self._redis.incr(key)
+
+    async def get_counter(self, key: str) -> int:
+        raw = await self._redis.get(key)
+        return int(raw) if raw is not None else 0
+
+
+def create_backend(url: Optional[str] = config.CACHE_URL) -> CacheBackend:
+    if url and url.startswith('redis'):
+        return RedisCache(url)
+    return MemoryCache(config.PAGE_CACHE_MAX_ENTRIES)
+
+
+class PageCache:
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def key_for(self, tag: str, request: Request) -> str:
+        generation = await self.backend.get_counter(f'generation:{tag}')
+        query = '&'.join(f'{k}={v}' for k, v in sorted(request.query_params.multi_items()))
+        return f'page:{tag}:{generation}:{request.url.netloc}{request.url.path}?{query}'
+
+    # Вызывается из админки после изменения данных
+    async def invalidate(self, tag: str) -> None:
+        await self.backend.incr(f'generation:{tag}')
+
+
+page_cache = PageCache(create_backend(), config.PAGE_CACHE_TTL)
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    return etag in [value.strip() for value in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+
+def _cached_response(request: Request, etag: str, body: bytes, media_type: str) -> Response:
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+# Ответ с ETag для страниц, которые не кэшируются на сервере: на If-None-Match с тем же значением - 304 без тела
+def conditional_response(request: Request, body: bytes, media_type: str) -> Response:
+    return _cached_response(request, make_etag(body), body, media_type)
+
+
+'''Декоратор для GET-обработчиков, возвращающих HTML. Ставится под декоратором роутера:
+    @router.get("/", response_class=HTMLResponse, name="store")
+    @cache_page("store")
+    async def store(request: Request, ...):
+Обработчик должен принимать параметр request. Кэшируются только ответы со статусом 200.'''
+
+def cache_page(tag: str):
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            request: Request = kwargs['request']
+            key = await page_cache.key_for(tag, request)
+            cached = await page_cache.backend.get(key)
+            if cached is not None:
+                return _cached_response(request, *cached)
+
+            response = await endpoint(*args, **kwargs)
+            if response.status_code != 200 or not hasattr(response, 'body'):
+                return response
+            etag = make_etag(response.body)
+            await page_cache.backend.set(key, (etag, response.body, response.media_type), page_cache.ttl)
+            return _cached_response(request, etag, response.body, response.media_type)
+        return wrapper
+    return decorator
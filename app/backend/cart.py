@@ -0,0 +1,120 @@
+'''Корзина покупателя на стороне сервера.
+Раньше весь список товаров хранился в подписанной cookie сессии и передавался с каждым запросом.
+Теперь в сессии лежит только короткий cart_id, а строки корзины (товар -> количество) хранятся в хранилище:
+- DbCartStore - таблица cart_items, добавление одним UPSERT, удаление одним DELETE по первичному ключу;
+- MemoryCartStore - словарь в памяти процесса (для разработки и тестов, CART_BACKEND=memory).
+При удалении товара из каталога его строки удаляются из всех корзин (forget_product) в транзакции удаления:
+на ON DELETE CASCADE полагаться нельзя, SQLite не проверяет внешние ключи без PRAGMA foreign_keys=ON.
+Товары корзины берутся из кэша товаров (backend/product_cache.py), недостающие - одним запросом Store.id IN (...).'''
+
+import os
+import sys
+import uuid
+from typing import Dict, List, Tuple
+
+from fastapi import Request
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from backend.product_cache import product_cache
+from models.store import CartItem, Store
+
+
+# Идентификатор корзины текущей сессии (создается при первом обращении)
+def get_cart_id(request: Request) -> str:
+    cart_id = request.session.get('cart_id')
+    if cart_id is None:
+        cart_id = uuid.uuid4().hex
+        request.session['cart_id'] = cart_id
+    return cart_id
+
+
+class CartStore:
+    async def items(self, db: AsyncSession, cart_id: str) -> Dict[int, int]:
+        raise NotImplementedError
+
+    async def add(self, db: AsyncSession, cart_id: str, product_id: int, quantity: int = 1) -> None:
+        raise NotImplementedError
+
+    async def remove(self, db: AsyncSession, cart_id: str, product_id: int) -> None:
+        raise NotImplementedError
+
+    # commit=False - очистка в транзакции вызывающего кода (оформление заказа)
+    async def clear(self, db: AsyncSession, cart_id: str, commit: bool = True) -> None:
+        raise NotImplementedError
+
+    # Удаление товара из всех корзин; коммит выполняет вызывающий код (удаление товара в админке)
+    async def forget_product(self, db: AsyncSession, product_id: int) -> None:
+        raise NotImplementedError
+
+
+class MemoryCartStore(CartStore):
+    def __init__(self):
+        self._carts: Dict[str, Dict[int, int]] = {}
+
+    async def items(self, db, cart_id):
+        return dict(self._carts.get(cart_id, {}))
+
+    async def add(self, db, cart_id, product_id, quantity=1):
+        cart = self._carts.setdefault(cart_id, {})
+        cart[product_id] = cart.get(product_id, 0) + quantity
+
+    async def remove(self, db, cart_id, product_id):
+        self._carts.get(cart_id, {}).pop(product_id, None)
+
+    async def clear(self, db, cart_id, commit=True):
+        self._carts.pop(cart_id, None)
+
+    async def forget_product(self, db, product_id):
+        for cart in self._carts.values():
+            cart.pop(product_id, None)
+
+
+class DbCartStore(CartStore):
+    async def items(self, db, cart_id):
+        result = await db.execute(
+            select(CartItem.store_id, CartItem.quantity).where(CartItem.cart_id == cart_id))
+        return dict(result.all())
+
+    async def add(self, db, cart_id, product_id, quantity=1):
+        insert = postgresql_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+        statement = insert(CartItem).values(cart_id=cart_id, store_id=product_id, quantity=quantity)
+        statement = statement.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.store_id],
+            set_={'quantity': CartItem.quantity + statement.excluded.quantity},
+        )
+        await db.execute(statement)
+        await db.commit()
+
+    async def remove(self, db, cart_id, product_id):
+        await db.execute(delete(CartItem).where(CartItem.cart_id == cart_id, CartItem.store_id == product_id))
+        await db.commit()
+
+    async def clear(self, db, cart_id, commit=True):
+        await db.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+        if commit:
+            await db.commit()
+
+    async def forget_product(self, db, product_id):
+        await db.execute(delete(CartItem).where(CartItem.store_id == product_id))
+
+
+cart_store: CartStore = MemoryCartStore() if config.CART_BACKEND == 'memory' else DbCartStore()
+
+
+'''Товары корзины с количеством: список (товар, количество) и общая стоимость.
+Товары берутся из кэша, отсутствующие в нем загружаются одним запросом.'''
+
+async def cart_lines(db: AsyncSession, cart_id: str) -> Tuple[List[Tuple[Store, int]], int]:
+    quantities = await cart_store.items(db, cart_id)
+    if not quantities:
+        return [], 0
+    products = await product_cache.get_many(db, sorted(quantities))
+    lines = [(products[product_id], quantity) for product_id, quantity in sorted(quantities.items())
+             if product_id in products]
+    total_cost = sum((product.cost or 0) * quantity for product, quantity in lines)
+    return lines, total_cost
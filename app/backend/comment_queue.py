@@ -0,0 +1,177 @@
+'''Запись комментариев через очередь (write-behind) с модерацией в фоне.
+Раньше create_comment искал дубликат по полному тексту (Comment.body без индекса - просмотр всей таблицы)
+и сразу вставлял строку: всплеск комментариев под популярным постом выстраивался в очередь за блокировкой
+записи SQLite, и каждый ответ ждал свою транзакцию.
+Теперь:
+- дубликат ищется по хешу нормализованного текста (body_hash) через уникальный индекс (post_id, body_hash),
+  при одновременной отправке одинаковых текстов лишний отбрасывается тем же индексом (ON CONFLICT DO NOTHING);
+- обработчик запроса только кладет комментарий в очередь и сразу отвечает 202;
+- фоновый обработчик собирает пачку (до COMMENT_BATCH_SIZE комментариев за COMMENT_BATCH_DELAY секунд),
+  проверяет каждый комментарий на спам и записывает пачку одним INSERT в одной транзакции вместе со счетчиками постов;
+- комментарии, не прошедшие проверку, сохраняются скрытыми (active=false) и ждут решения в админке
+  (PUT /admin/all_comments/{id}/active).
+Очередь живет в памяти процесса: при остановке приложения она дописывается (stop), а при аварийном
+завершении процесса неполная пачка теряется. Если пачка не записалась (ошибка в одной из строк),
+комментарии записываются по одному, а ошибки пишутся в журнал (logging). Если очередь переполнена или выключена
+(COMMENT_QUEUE_ENABLED=0), комментарий записывается сразу в запросе.'''
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from backend.cache import page_cache
+from backend.comment_stats import comment_added
+from backend.db import SessionLocal
+from backend.pagination import count_cache
+from models.posts import Comment, Post
+
+
+log = logging.getLogger(__name__)
+_LINK = re.compile(r'https?://|www\.', re.IGNORECASE)
+_REPEATED_CHARS = re.compile(r'(.)\1{9,}')  # "ааааааааааа", "!!!!!!!!!!!"
+WRITE_RETRIES = 3
+
+
+# Хеш текста комментария без учета регистра и пробелов: "Отличная  статья" и "отличная статья" - дубликаты
+def body_hash(body: str) -> str:
+    return hashlib.sha256(' '.join(body.split()).lower().encode('utf-8')).hexdigest()
+
+
+# Проверка на спам: слишком много ссылок, стоп-слова, длинные повторы символов
+def passes_moderation(body: str) -> bool:
+    if len(_LINK.findall(body)) > config.COMMENT_MAX_LINKS:
+        return False
+    lowered = body.lower()
+    if any(word in lowered for word in config.COMMENT_STOP_WORDS):
+        return False
+    return _REPEATED_CHARS.search(body) is None
+
+
+'''Проверка перед постановкой в очередь одним запросом (дубликат - по уникальному индексу post_id, body_hash):
+None - поста нет, True - такой комментарий к посту уже есть, False - можно добавлять.'''
+
+async def find_duplicate(db: AsyncSession, post_id: int, key: str) -> Optional[bool]:
+    duplicate = select(Comment.id).where(Comment.post_id == post_id, Comment.body_hash == key).exists()
+    found = (await db.execute(select(duplicate.label("duplicate")).where(Post.id == post_id))).first()
+    return None if found is None else bool(found.duplicate)
+
+
+'''Модерация и запись пачки комментариев одной транзакцией, возвращает число сохраненных.
+Комментарий - словарь с ключами post_id, name, email, body, body_hash, created.'''
+
+async def write_comments(comments: List[dict]) -> int:
+    rows: Dict[Tuple[int, str], dict] = {}
+    for comment in comments:
+        rows.setdefault((comment['post_id'], comment['body_hash']),
+                        dict(comment, active=passes_moderation(comment['body'])))
+
+    async with SessionLocal() as db:
+        insert = postgresql_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+        result = await db.execute(
+            insert(Comment)
+            .values(list(rows.values()))
+            .on_conflict_do_nothing(index_elements=[Comment.post_id, Comment.body_hash])
+            .returning(Comment.post_id, Comment.active, Comment.created)
+        )
+        inserted = result.all()
+
+        # счетчики постов: один UPDATE на пост, а не на комментарий
+        stats: Dict[int, Tuple[int, datetime]] = {}
+        for post_id, active, created in inserted:
+            if active:
+                count, last = stats.get(post_id, (0, created))
+                stats[post_id] = (count + 1, max(last, created))
+        for post_id, (count, last) in stats.items():
+            await comment_added(db, post_id, last, count)
+        await db.commit()
+
+    if stats:
+        count_cache.invalidate("posts")
+        await page_cache.invalidate("posts")
+    return len(inserted)
+
+
+class CommentQueue:
+    def __init__(self, max_size: int = config.COMMENT_QUEUE_MAX, batch_size: int = config.COMMENT_BATCH_SIZE,
+                 batch_delay: float = config.COMMENT_BATCH_DELAY):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._worker = asyncio.create_task(self._run())
+
+    # Остановка при выключении приложения: сначала дописываются все принятые комментарии
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        self._worker = None
+
+    # Прием комментария; без запущенного обработчика или при переполнении очереди - запись сразу
+    async def submit(self, comment: dict) -> None:
+        if self._worker is not None:
+            try:
+                self._queue.put_nowait(comment)
+                return
+            except asyncio.QueueFull:
+                pass
+        await write_comments([comment])
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            if self.batch_delay > 0:
+                await asyncio.sleep(self.batch_delay)  # пока ждем, в очередь успевает попасть весь всплеск
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    # Запись пачки; если она не прошла, комментарии пишутся по одному и теряется только тот, что вызвал ошибку
+    @classmethod
+    async def _write(cls, batch: List[dict]) -> None:
+        for attempt in range(WRITE_RETRIES):
+            try:
+                await write_comments(batch)
+                return
+            except OperationalError:  # база занята дольше busy_timeout - пробуем еще раз
+                if attempt < WRITE_RETRIES - 1:
+                    await asyncio.sleep(0.1 * (attempt + 1))
+            except Exception:  # ошибка в данных (например, пост удален после проверки) - повтор не поможет
+                if len(batch) == 1:
+                    log.exception('Комментарий к посту %s не сохранен', batch[0]['post_id'])
+                    return
+                break
+        if len(batch) == 1:
+            log.error('Комментарий к посту %s не сохранен: база занята', batch[0]['post_id'])
+            return
+        log.warning('Пачка комментариев (%s) не сохранена, запись по одному', len(batch))
+        for comment in batch:
+            await cls._write([comment])
+
+
+comment_queue = CommentQueue()
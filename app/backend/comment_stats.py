@@ -0,0 +1,106 @@
+'''Денормализованные счетчики комментариев поста: posts.comment_count (число активных комментариев)
+и posts.last_comment_at (время последнего активного комментария).
+Списки "самые обсуждаемые" и "недавно обсуждаемые" сортируются по этим колонкам через индекс,
+без COUNT/MAX с GROUP BY по таблице комментариев на каждый просмотр.
+Счетчики меняются в той же транзакции, что и комментарий:
+- новые комментарии - comment_added (UPDATE ... SET comment_count = comment_count + n, без чтения строки);
+- удаление или скрытие комментария - refresh_comment_stats (пересчет одного поста по индексу post_id, active, created).
+Если значения все же разошлись (ручные правки в базе, импорт), их исправляет reconcile_comment_stats:
+периодически в приложении (COMMENT_STATS_RECONCILE_INTERVAL) или командой
+    python app/backend/comment_stats.py'''
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from models.posts import Comment, Post
+
+
+# значения счетчиков, вычисленные по таблице комментариев (post_id - число или колонка Post.id)
+def _actual_stats(post_id) -> dict:
+    active = (Comment.post_id == post_id) & Comment.active.is_(True)
+    return {
+        'comment_count': select(func.count()).where(active).scalar_subquery(),
+        'last_comment_at': select(func.max(Comment.created)).where(active).scalar_subquery(),
+    }
+
+
+'''Учет новых активных комментариев поста (count - сколько добавлено, created - время самого позднего).
+Коммит выполняет вызывающий код. Загруженные в сессию объекты Post не обновляются (synchronize_session=False).'''
+
+async def comment_added(db: AsyncSession, post_id: int, created: datetime, count: int = 1) -> None:
+    await db.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(
+            comment_count=Post.comment_count + count,
+            last_comment_at=case(
+                (Post.last_comment_at.is_(None) | (Post.last_comment_at < created), created),
+                else_=Post.last_comment_at,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+'''Пересчет счетчиков одного поста после удаления или скрытия комментария (изменение уже должно быть в сессии).
+Коммит выполняет вызывающий код.'''
+
+async def refresh_comment_stats(db: AsyncSession, post_id: int) -> None:
+    await db.flush()
+    await db.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(**_actual_stats(post_id))
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Исправление расхождений по всем постам одним UPDATE, возвращает число исправленных постов
+async def reconcile_comment_stats(db: AsyncSession) -> int:
+    actual = _actual_stats(Post.id)
+    result = await db.execute(
+        update(Post)
+        .where((Post.comment_count != actual['comment_count'])
+               | Post.last_comment_at.is_distinct_from(actual['last_comment_at']))
+        .values(**actual)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+# Фоновая сверка в приложении раз в COMMENT_STATS_RECONCILE_INTERVAL секунд (0 - отключена)
+async def reconcile_periodically() -> None:
+    from backend.cache import page_cache
+    from backend.db import SessionLocal
+    from backend.pagination import count_cache
+
+    while True:
+        await asyncio.sleep(config.COMMENT_STATS_RECONCILE_INTERVAL)
+        try:
+            async with SessionLocal() as db:
+                fixed = await reconcile_comment_stats(db)
+        except Exception as e:
+            print(f'Не удалось сверить счетчики комментариев: {e}')
+            continue
+        if fixed:
+            print(f'Счетчики комментариев исправлены у постов: {fixed}')
+            count_cache.invalidate("posts")
+            await page_cache.invalidate("posts")
+
+
+if __name__ == '__main__':
+    from backend.db import SessionLocal
+
+    async def main():
+        async with SessionLocal() as db:
+            print(f'Счетчики комментариев исправлены у постов: {await reconcile_comment_stats(db)}')
+
+    asyncio.run(main())
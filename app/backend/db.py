@@ -1,21 +1,66 @@
-'''Этот код создает асинхронную настройку для работы с базой данных SQLite, 
-определяет базовый класс для моделей и предоставляет функции для создания и удаления таблиц в базе данных.'''
+'''Этот код создает асинхронную настройку для работы с базой данных,
+определяет базовый класс для моделей и предоставляет функции для создания и удаления таблиц в базе данных.
+Параметры подключения берутся из backend/config.py (переменные окружения):
+для SQLite к каждому соединению применяются прагмы (WAL, synchronous, mmap, cache, busy_timeout),
+для PostgreSQL (asyncpg) настраивается пул соединений.'''
 
-from sqlalchemy.orm import DeclarativeBase  
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import os
+import sys
 
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
 
-engine = create_async_engine('sqlite+aiosqlite:///Mystore.db', echo=True)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+
+
+'''Применение прагм SQLite при открытии соединения.
+WAL позволяет читать параллельно с записью, synchronous=NORMAL в режиме WAL безопасен и заметно быстрее FULL,
+busy_timeout заставляет ждать освобождения блокировки вместо немедленной ошибки "database is locked".'''
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f'PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}')
+    cursor.execute(f'PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}')
+    cursor.execute(f'PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}')
+    cursor.execute(f'PRAGMA cache_size={config.SQLITE_CACHE_SIZE}')
+    cursor.execute(f'PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT}')
+    cursor.close()
+
+
+# Фабрика движка: профиль выбирается по диалекту из адреса базы данных
+def create_engine(url: str = config.DATABASE_URL, echo: bool = config.DB_ECHO) -> AsyncEngine:
+    backend_name = make_url(url).get_backend_name()
+
+    if backend_name == 'sqlite':
+        engine = create_async_engine(url, echo=echo)
+        event.listen(engine.sync_engine, 'connect', _set_sqlite_pragmas)
+        return engine
+
+    return create_async_engine(
+        url,
+        echo=echo,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+    )
+
+
+engine = create_engine()
 SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
 
 
-class Base(DeclarativeBase):  
+class Base(DeclarativeBase):
     pass
 
 
 
 '''
-Эта функция создает все таблицы, определенные в ваших моделях, используя метаданные, связанные с базовым классом Base. 
+Эта функция создает все таблицы, определенные в ваших моделях, используя метаданные, связанные с базовым классом Base.
 Она использует асинхронный контекстный менеджер для управления соединением с базой данных.
 В данном проекте таблицы создаются в файле evn'''
 
@@ -28,4 +73,4 @@ async def create_tables():
 async def delete_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
-        
\ No newline at end of file
+
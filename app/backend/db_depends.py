@@ -2,7 +2,12 @@
 Она обеспечивает создание, использование и корректное закрытие сессии, что является важным аспектом работы с базами данных для предотвращения утечек ресурсов. 
 В контексте фреймворков, таких как FastAPI, эту функцию часто используют в зависимости для обработки запросов к базе данных.'''
 
-from app.backend.db import SessionLocal
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# тот же модуль backend.db, что и во всем приложении: один движок и один пул соединений
+from backend.db import SessionLocal
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import AsyncGenerator
 
@@ -0,0 +1,192 @@
+'''Инструментирование SQL-запросов.
+Обработчики событий before/after_cursor_execute (класс Engine - все движки, в том числе AsyncEngine)
+измеряют каждый запрос и записывают его:
+- в статистику текущего HTTP-запроса (ContextVar): число запросов, общее время БД и самые медленные запросы,
+  QueryTimingMiddleware отдает их в заголовке Server-Timing (видно во вкладке Network браузера);
+- в общие счетчики процесса, которые отдает /metrics в текстовом формате Prometheus;
+- в журнал медленных запросов (дольше SLOW_QUERY_MS, выборочно с долей SLOW_QUERY_SAMPLE_RATE).
+В журнал не попадают значения параметров: строковые литералы в тексте запроса заменяются на '?',
+от параметров остаются только типы.'''
+
+import heapq
+import logging
+import os
+import random
+import re
+import sys
+import time
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from backend.histogram import Histogram
+
+
+# Журнал медленных запросов
+slow_query_log = logging.getLogger('slow_queries')
+if not slow_query_log.handlers:
+    _handler = logging.FileHandler(config.SLOW_QUERY_LOG_FILE) if config.SLOW_QUERY_LOG_FILE else logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_query_log.addHandler(_handler)
+    slow_query_log.setLevel(logging.WARNING)
+    slow_query_log.propagate = False
+
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+"?(\w+)', re.IGNORECASE)
+
+
+# Текст запроса без значений: строковые литералы заменяются на '?', пробелы схлопываются
+def redact(statement: str) -> str:
+    return ' '.join(_LITERAL.sub("'?'", statement).split())
+
+
+# Параметры запроса без значений: только типы ("(str, int)", "{name: str}", "executemany x 1000")
+def describe_parameters(parameters, executemany: bool) -> str:
+    if executemany:
+        return f'executemany x {len(parameters)}'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{name}: {type(value).__name__}' for name, value in parameters.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters or ()) + ')'
+
+
+# Короткая подпись запроса для Server-Timing: "SELECT store"
+def statement_label(statement: str) -> str:
+    words = statement.split(None, 1)
+    verb = words[0].upper() if words else '?'
+    table = _TABLE.search(statement)
+    return f'{verb} {table.group(1)}' if table else verb
+
+
+# Общие счетчики процесса
+query_duration = Histogram((0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+queries_per_request = Histogram((0, 1, 2, 3, 5, 10, 20, 50, 100))
+db_time_per_request = Histogram((0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+slow_queries_total = 0
+query_errors_total = 0
+
+
+class RequestQueries:
+    '''Статистика SQL одного HTTP-запроса.'''
+
+    def __init__(self, route: str = ''):
+        self.route = route
+        self.count = 0
+        self.total = 0.0
+        self.slowest: List[Tuple[float, str]] = []  # куча (время, подпись) размером SERVER_TIMING_SLOWEST
+
+    def record(self, elapsed: float, statement: str) -> None:
+        self.count += 1
+        self.total += elapsed
+        limit = config.SERVER_TIMING_SLOWEST
+        if len(self.slowest) < limit:
+            heapq.heappush(self.slowest, (elapsed, statement_label(statement)))
+        elif limit and elapsed > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (elapsed, statement_label(statement)))
+
+    # db;dur=12.5;desc="4 queries", db-1;dur=8.1;desc="SELECT store", ...
+    def server_timing(self) -> str:
+        parts = [f'db;dur={self.total * 1000:.2f};desc="{self.count} queries"']
+        for number, (elapsed, label) in enumerate(sorted(self.slowest, reverse=True), 1):
+            parts.append(f'db-{number};dur={elapsed * 1000:.2f};desc="{label}"')
+        return ', '.join(parts)
+
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar('request_queries', default=None)
+
+
+def current_request_queries() -> Optional[RequestQueries]:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    global slow_queries_total
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    query_duration.observe(elapsed)
+
+    stats = _current.get()
+    if stats is not None:
+        stats.record(elapsed, statement)
+
+    if elapsed * 1000 >= config.SLOW_QUERY_MS:
+        slow_queries_total += 1
+        if random.random() < config.SLOW_QUERY_SAMPLE_RATE:
+            route = stats.route if stats is not None else '-'
+            slow_query_log.warning('медленный запрос %.1f мс [%s] %s | параметры: %s',
+                                   elapsed * 1000, route, redact(statement),
+                                   describe_parameters(parameters, executemany))
+
+
+# after_cursor_execute не вызывается при ошибке - снимаем время начала со стека
+def _handle_error(exception_context):
+    global query_errors_total
+    query_errors_total += 1
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_start'):
+        conn.info['query_start'].pop()
+
+
+if config.DB_METRICS_ENABLED:
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+
+
+'''ASGI middleware: создает статистику SQL на время HTTP-запроса и добавляет к ответу заголовок Server-Timing.
+Заголовки отправляются до тела ответа, поэтому запросы потоковых ответов (выгрузка базы) в заголовок не попадают,
+но учитываются в /metrics.'''
+
+class QueryTimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not config.DB_METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueries(f"{scope['method']} {scope['path']}")
+        token = _current.set(stats)
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message).append('Server-Timing', stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            queries_per_request.observe(stats.count)
+            db_time_per_request.observe(stats.total)
+
+
+# Счетчики SQL в текстовом формате Prometheus
+def render_prometheus() -> str:
+    lines = [
+        '# HELP db_query_duration_seconds SQL statement execution time.',
+        '# TYPE db_query_duration_seconds histogram',
+        *query_duration.render('db_query_duration_seconds'),
+        '# HELP db_queries_per_request SQL statements executed per HTTP request.',
+        '# TYPE db_queries_per_request histogram',
+        *queries_per_request.render('db_queries_per_request'),
+        '# HELP db_time_per_request_seconds Total SQL time per HTTP request.',
+        '# TYPE db_time_per_request_seconds histogram',
+        *db_time_per_request.render('db_time_per_request_seconds'),
+        '# HELP db_slow_queries_total SQL statements slower than SLOW_QUERY_MS.',
+        '# TYPE db_slow_queries_total counter',
+        f'db_slow_queries_total {slow_queries_total}',
+        '# HELP db_query_errors_total SQL statements that raised an error.',
+        '# TYPE db_query_errors_total counter',
+        f'db_query_errors_total {query_errors_total}',
+    ]
+    return '\n'.join(lines) + '\n'
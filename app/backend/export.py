@@ -0,0 +1,45 @@
+'''Потоковая выгрузка таблиц (CSV, NDJSON).
+Строки читаются из базы серверным курсором пачками по config.EXPORT_BATCH_SIZE (AsyncSession.stream + yield_per)
+и сразу отправляются клиенту, поэтому расход памяти не зависит от размера таблицы,
+а первый байт ответа приходит сразу после первой пачки.
+Сессия открывается внутри генератора: зависимость get_db закрывается до начала отправки потокового ответа.'''
+
+import csv
+import io
+import json
+import os
+import sys
+from typing import AsyncIterator, Sequence
+
+from sqlalchemy import Select
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from backend.db import SessionLocal
+
+
+async def _stream_partitions(query: Select) -> AsyncIterator[Sequence]:
+    async with SessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=config.EXPORT_BATCH_SIZE))
+        async for partition in result.partitions():
+            yield partition
+
+
+async def stream_csv(query: Select) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in query.selected_columns])
+    yield buffer.getvalue().encode()
+
+    async for partition in _stream_partitions(query):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(partition)
+        yield buffer.getvalue().encode()
+
+
+async def stream_ndjson(query: Select) -> AsyncIterator[bytes]:
+    names = [column.name for column in query.selected_columns]
+    async for partition in _stream_partitions(query):
+        lines = [json.dumps(dict(zip(names, row)), ensure_ascii=False, default=str) for row in partition]
+        yield ('\n'.join(lines) + '\n').encode()
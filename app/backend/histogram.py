@@ -0,0 +1,35 @@
+'''Гистограмма для метрик в формате Prometheus.
+Границы корзин задаются заранее, наблюдение - поиск корзины делением пополам (bisect) и увеличение счетчика,
+без выделения памяти. Подписи le="..." и метки строятся один раз, при создании гистограммы.'''
+
+from bisect import bisect_left
+from typing import List, Tuple
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_bounds')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._bounds = [str(bound) for bound in buckets] + ['+Inf']
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # строки name_bucket{labels,le="..."} (накопительные), name_sum, name_count
+    def render(self, name: str, labels: str = '') -> List[str]:
+        prefix = labels + ',' if labels else ''
+        suffix = '{' + labels + '}' if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{suffix} {self.sum:.6f}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
@@ -0,0 +1,120 @@
+'''Метрики HTTP-запросов: задержка, размер ответа и коды ответов по маршрутам, число запросов в обработке.
+Маршрут берется из шаблона пути (scope["route"].path, например /posts/{year}/{month}/{day}/{post}),
+а не из фактического адреса, поэтому число меток ограничено числом маршрутов приложения;
+метод - из стандартного набора, любой другой (его присылает клиент) учитывается как OTHER.
+Накладные расходы минимальны: объект метрик маршрута со строкой меток и гистограммами с заранее заданными
+корзинами создается один раз при первом обращении, на каждый запрос - только поиск в словаре и увеличение счетчиков.
+Процентили (p50/p99) считаются в Prometheus: histogram_quantile(0.99, rate(http_request_duration_seconds_bucket[5m])).'''
+
+import os
+import sys
+import time
+from typing import Dict
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.histogram import Histogram
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # секунды
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)  # байты
+
+# адреса, не совпавшие ни с одним маршрутом (404), учитываются под одной меткой
+UNMATCHED_ROUTE = '<unmatched>'
+# методы HTTP, для которых заводятся отдельные метки; остальные - под одной меткой
+KNOWN_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'CONNECT', 'TRACE'))
+OTHER_METHOD = 'OTHER'
+
+
+class RouteMetrics:
+    __slots__ = ('labels', 'latency', 'size', 'statuses')
+
+    def __init__(self, method: str, route: str):
+        self.labels = f'method="{method}",route="{route}"'
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.statuses: Dict[int, int] = {}  # код ответа -> количество
+
+
+# шаблон маршрута -> метод -> метрики
+_routes: Dict[str, Dict[str, RouteMetrics]] = {}
+in_flight = 0
+
+
+def route_metrics(method: str, route: str) -> RouteMetrics:
+    by_method = _routes.get(route)
+    if by_method is None:
+        by_method = _routes[route] = {}
+    metrics = by_method.get(method)
+    if metrics is None:
+        metrics = by_method[method] = RouteMetrics(method, route)
+    return metrics
+
+
+'''Шаблон маршрута запроса. Router дописывает в scope найденный маршрут (FastAPI - scope["route"]),
+для смонтированных приложений (StaticFiles) - root_path монтирования, например /static.'''
+
+def route_template(scope) -> str:
+    route = scope.get('route')
+    if route is not None:
+        return route.path
+    if 'endpoint' in scope:
+        return scope.get('root_path') or UNMATCHED_ROUTE
+    return UNMATCHED_ROUTE
+
+
+class HttpMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        global in_flight
+        start = time.perf_counter()
+        status_code = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status_code, size
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            in_flight -= 1
+            method = scope['method'] if scope['method'] in KNOWN_METHODS else OTHER_METHOD
+            metrics = route_metrics(method, route_template(scope))
+            metrics.latency.observe(time.perf_counter() - start)
+            metrics.size.observe(size)
+            metrics.statuses[status_code] = metrics.statuses.get(status_code, 0) + 1
+
+
+# Метрики HTTP в текстовом формате Prometheus
+def render_prometheus() -> str:
+    all_metrics = [metrics for by_method in _routes.values() for metrics in by_method.values()]
+    lines = [
+        '# HELP http_requests_in_flight HTTP requests being processed.',
+        '# TYPE http_requests_in_flight gauge',
+        f'http_requests_in_flight {in_flight}',
+        '# HELP http_request_duration_seconds HTTP request latency by route template.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for metrics in all_metrics:
+        lines.extend(metrics.latency.render('http_request_duration_seconds', metrics.labels))
+    lines.append('# HELP http_response_size_bytes HTTP response body size by route template.')
+    lines.append('# TYPE http_response_size_bytes histogram')
+    for metrics in all_metrics:
+        lines.extend(metrics.size.render('http_response_size_bytes', metrics.labels))
+    lines.append('# HELP http_responses_total HTTP responses by route template and status code.')
+    lines.append('# TYPE http_responses_total counter')
+    for metrics in all_metrics:
+        for status_code, count in sorted(metrics.statuses.items()):
+            lines.append(f'http_responses_total{{{metrics.labels},status="{status_code}"}} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,172 @@
+'''Загрузка изображений товаров и постов и адаптивные миниатюры.
+Файл, загруженный в админке, сохраняется по хешу содержимого: media/images/ab/<sha256>/original.jpg,
+в Store.photo / Post.image записывается его адрес /media/images/ab/<sha256>/original.jpg.
+Миниатюры шириной IMAGE_WIDTHS (без увеличения) в форматах AVIF, WebP и JPEG (PNG для картинок с прозрачностью)
+создаются в пуле процессов уже после ответа админке, поэтому Pillow не занимает ни цикл событий, ни GIL.
+Когда миниатюры готовы, рядом появляется index.json, а кэш страниц с этими картинками сбрасывается.
+Шаблоны выводят <picture> с srcset (макрос picture в templates/images.html), браузер выбирает
+подходящую ширину и формат: карточка каталога шириной 200px загружает миниатюру 320px вместо полного фото.
+Файлы с хешем в пути не меняются, поэтому /media отдается с Cache-Control: immutable.
+Pillow - необязательная зависимость (pip install pillow): без нее сохраняются только исходные файлы.'''
+
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Set
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from backend.cache import page_cache
+
+
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif'}
+INDEX_FILE = 'index.json'
+PILLOW_AVAILABLE = importlib.util.find_spec('PIL') is not None
+_MEDIA_PATH = re.compile(r'^/media/images/([0-9a-f]{2})/([0-9a-f]{64})/')
+
+
+'''Создание миниатюр - выполняется в отдельном процессе. Для каждой ширины из widths, не больше исходной,
+сохраняются варианты <ширина>.avif / .webp и запасной <ширина>.jpg (.png при прозрачности).
+index.json записывается последним: пока его нет, шаблоны выводят исходный файл.'''
+
+def generate_variants(directory: str, original: str, widths: tuple, quality: int) -> dict:
+    from PIL import Image, ImageOps, features
+
+    formats = [name for name in ('avif', 'webp') if features.check(name)]
+    with Image.open(original) as image:
+        image = ImageOps.exif_transpose(image)  # поворот по EXIF, иначе фото с телефона лягут набок
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        fallback = 'png' if has_alpha else 'jpg'
+        sizes = [width for width in widths if width < image.width] + [min(image.width, max(widths))]
+
+        for width in sorted(set(sizes)):
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            for extension in formats + [fallback]:
+                options = {'optimize': True} if extension == 'png' else {'quality': quality}
+                resized.save(os.path.join(directory, f'{width}.{extension}'), **options)
+
+        index = {'width': image.width, 'height': image.height, 'widths': sorted(set(sizes)),
+                 'formats': formats, 'fallback': fallback}
+
+    with open(os.path.join(directory, INDEX_FILE + '.tmp'), 'w', encoding='utf-8') as file:
+        json.dump(index, file)
+    os.replace(os.path.join(directory, INDEX_FILE + '.tmp'), os.path.join(directory, INDEX_FILE))
+    return index
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pending: Set[asyncio.Task] = set()  # ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+
+
+def _image_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=config.IMAGE_WORKERS)
+    return _pool
+
+
+def shutdown_image_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=False)
+        _pool = None
+
+
+def _write_file(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as file:
+        file.write(data)
+    os.replace(path + '.tmp', path)
+
+
+async def _process_in_background(directory: str, original: str, cache_tag: str) -> None:
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(_image_pool(), generate_variants, directory, original,
+                                   config.IMAGE_WIDTHS, config.IMAGE_QUALITY)
+    except Exception as e:
+        print(f'Не удалось обработать изображение {original}: {e}')
+        return
+    await page_cache.invalidate(cache_tag)
+
+
+'''Сохранение загруженного изображения, возвращает адрес исходного файла для Store.photo / Post.image.
+Повторная загрузка того же файла ничего не пересчитывает: путь определяется хешем содержимого.'''
+
+async def save_image(upload: UploadFile, cache_tag: str) -> str:
+    extension = os.path.splitext(upload.filename or '')[1].lower()
+    if extension not in ALLOWED_EXTENSIONS or not (upload.content_type or '').startswith('image/'):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image type")
+    data = await upload.read(config.IMAGE_MAX_UPLOAD + 1)
+    if len(data) > config.IMAGE_MAX_UPLOAD:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image is too large")
+
+    key = hashlib.sha256(data).hexdigest()
+    relative = f'images/{key[:2]}/{key}'
+    directory = os.path.join(config.MEDIA_DIR, relative)
+    original = os.path.join(directory, f'original{extension}')
+    if not os.path.exists(original):
+        await asyncio.to_thread(_write_file, original, data)
+
+    if PILLOW_AVAILABLE and not os.path.exists(os.path.join(directory, INDEX_FILE)):
+        task = asyncio.create_task(_process_in_background(directory, original, cache_tag))
+        _pending.add(task)
+        task.add_done_callback(_pending.discard)
+    return f'/media/{relative}/original{extension}'
+
+
+# готовые index.json по хешу файла (содержимое по хешу не меняется, поэтому кэш не устаревает)
+_variants: Dict[str, dict] = {}
+
+
+'''Данные для <picture>: src, srcset запасного формата, источники AVIF/WebP и размеры.
+Для адресов не из /media/images (старые ссылки, внешние URL) и еще не обработанных файлов - только src.'''
+
+def image_variants(photo: Optional[str]) -> dict:
+    result = {'src': photo or '', 'srcset': '', 'sources': [], 'width': None, 'height': None}
+    match = _MEDIA_PATH.match(photo or '')
+    if match is None:
+        return result
+
+    key = match.group(2)
+    index = _variants.get(key)
+    if index is None:
+        index_path = os.path.join(config.MEDIA_DIR, 'images', match.group(1), key, INDEX_FILE)
+        try:
+            with open(index_path, encoding='utf-8') as file:
+                index = _variants[key] = json.load(file)
+        except FileNotFoundError:
+            return result
+
+    base = f'/media/images/{match.group(1)}/{key}'
+
+    def srcset(extension):
+        return ', '.join(f'{base}/{width}.{extension} {width}w' for width in index['widths'])
+
+    result['src'] = f"{base}/{index['widths'][-1]}.{index['fallback']}"
+    result['srcset'] = srcset(index['fallback'])
+    result['sources'] = [{'type': f'image/{extension}', 'srcset': srcset(extension)} for extension in index['formats']]
+    result['width'] = index['width']
+    result['height'] = index['height']
+    return result
+
+
+class MediaFiles(StaticFiles):
+    '''Загруженные файлы: путь содержит хеш содержимого, поэтому кэшируются браузером без перепроверки.'''
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            response.headers['Cache-Control'] = f'public, max-age={config.STATIC_MAX_AGE}, immutable'
+        return response
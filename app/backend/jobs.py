@@ -0,0 +1,191 @@
+'''Фоновые задачи с хранением в базе (таблица jobs).
+Медленные побочные действия (отправка письма по SMTP и т.п.) не выполняются в обработчике запроса:
+обработчик записывает задачу (enqueue) и сразу отвечает, а воркеры в том же процессе выполняют ее позже.
+- задача хранится в базе, поэтому переживает перезапуск приложения;
+- воркер сначала ищет готовую задачу обычным SELECT ... LIMIT 1 (по индексу status, run_at): пустая очередь
+  не создает транзакций записи и не спорит за блокировку записи SQLite с заказами и комментариями;
+- найденная задача захватывается UPDATE ... WHERE id = :id AND <задача еще готова> RETURNING: два воркера
+  (и два процесса) не возьмут одну задачу; в PostgreSQL SELECT выполняется с FOR UPDATE SKIP LOCKED;
+- при ошибке задача повторяется с растущей задержкой (JOB_RETRY_DELAY * 2^(попытка-1), не больше
+  JOB_RETRY_MAX_DELAY, со случайным разбросом), после JOB_MAX_ATTEMPTS попыток переносится в "мертвые"
+  (status='dead') с текстом последней ошибки - ее можно посмотреть и перезапустить командой ниже;
+- задача "running", брошенная упавшим процессом, через JOB_LOCK_TIMEOUT секунд берется снова.
+Обработчик регистрируется декоратором @job_handler('имя') и получает словарь аргументов из payload.
+Состояние очереди и перезапуск мертвых задач:
+    python app/backend/jobs.py
+    python app/backend/jobs.py --retry-dead'''
+
+import asyncio
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from backend.db import SessionLocal
+from models.jobs import Job
+
+
+_handlers: Dict[str, Callable[[dict], Awaitable[None]]] = {}
+
+
+# Регистрация обработчика задач вида kind
+def job_handler(kind: str):
+    def decorator(handler: Callable[[dict], Awaitable[None]]):
+        _handlers[kind] = handler
+        return handler
+    return decorator
+
+
+# Время в UTC без часового пояса: одинаково сравнивается в SQLite и в колонках timestamp PostgreSQL
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+'''Постановка задачи в очередь, возвращает ее id. commit=False - задача сохраняется вместе
+с остальными изменениями вызывающего кода (коммит выполняет он), delay - отложенный запуск (секунды).'''
+
+async def enqueue(db: AsyncSession, kind: str, payload: dict, max_attempts: Optional[int] = None,
+                  delay: float = 0.0, commit: bool = True) -> int:
+    job = Job(kind=kind, payload=json.dumps(payload, ensure_ascii=False), status='pending', attempts=0,
+              max_attempts=max_attempts or config.JOB_MAX_ATTEMPTS, run_at=_utcnow() + timedelta(seconds=delay))
+    db.add(job)
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
+    job_runner.wake()
+    return job.id
+
+
+# Захват следующей готовой задачи: статус running, попытка +1; None - готовых задач нет
+async def _claim(db: AsyncSession):
+    now = _utcnow()
+    ready = or_(and_(Job.status == 'pending', Job.run_at <= now),
+                and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=config.JOB_LOCK_TIMEOUT)))
+    job_id = await db.scalar(
+        select(Job.id).where(ready).order_by(Job.run_at, Job.id).limit(1).with_for_update(skip_locked=True))
+    if job_id is None:
+        await db.rollback()  # завершаем транзакцию чтения, записи не было
+        return None
+    # условие повторяется: между SELECT и UPDATE задачу мог захватить другой процесс (SQLite без FOR UPDATE)
+    result = await db.execute(
+        update(Job)
+        .where(Job.id == job_id, ready)
+        .values(status='running', locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+        .execution_options(synchronize_session=False)
+    )
+    job = result.first()
+    await db.commit()
+    return job
+
+
+async def _finish(db: AsyncSession, job, error: Optional[BaseException]) -> None:
+    now = _utcnow()
+    if error is None:
+        values = {'status': 'done', 'finished': now, 'locked_at': None}
+    else:
+        message = f'{type(error).__name__}: {error}'[:2000]
+        if job.attempts >= job.max_attempts:
+            values = {'status': 'dead', 'finished': now, 'locked_at': None, 'last_error': message}
+            print(f'Задача {job.id} ({job.kind}) не выполнена за {job.attempts} попыток: {message}')
+        else:
+            delay = min(config.JOB_RETRY_DELAY * 2 ** (job.attempts - 1), config.JOB_RETRY_MAX_DELAY)
+            delay *= 0.75 + random.random() / 2  # разброс, чтобы упавшие вместе задачи не повторялись вместе
+            values = {'status': 'pending', 'run_at': now + timedelta(seconds=delay), 'locked_at': None,
+                      'last_error': message}
+    await db.execute(update(Job).where(Job.id == job.id).values(**values)
+                     .execution_options(synchronize_session=False))
+    await db.commit()
+
+
+# Выполнение одной готовой задачи; False - выполнять нечего
+async def run_next_job() -> bool:
+    async with SessionLocal() as db:
+        job = await _claim(db)
+        if job is None:
+            return False
+        error = None
+        try:
+            handler = _handlers.get(job.kind)
+            if handler is None:
+                raise LookupError(f'Нет обработчика задач {job.kind}')
+            # дольше JOB_LOCK_TIMEOUT задача выполняться не должна: после него ее возьмет другой воркер
+            await asyncio.wait_for(handler(json.loads(job.payload)), config.JOB_LOCK_TIMEOUT)
+        except Exception as e:
+            error = e
+        await _finish(db, job, error)
+    return True
+
+
+class JobRunner:
+    '''Воркеры фоновых задач в процессе приложения: запускаются при старте, останавливаются при выключении.'''
+
+    def __init__(self, workers: int = config.JOB_WORKERS):
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def start(self) -> None:
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    # Новая задача в очереди: воркеры не ждут следующего опроса таблицы
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # Остановка: выполняемые задачи дорабатывают до timeout секунд, остальные остаются в таблице
+    async def stop(self, timeout: float = 10.0) -> None:
+        if not self._tasks:
+            return
+        self._stopping = True
+        self.wake()
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        self._tasks = []
+        self._wakeup = None
+
+    async def _work(self) -> None:
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                ran = await run_next_job()
+            except Exception as e:  # например, база недоступна - пробуем после паузы
+                print(f'Ошибка воркера фоновых задач: {e}')
+                ran = False
+            if not ran and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), config.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+
+job_runner = JobRunner()
+
+
+if __name__ == '__main__':
+    async def main():
+        async with SessionLocal() as db:
+            if '--retry-dead' in sys.argv:
+                result = await db.execute(update(Job).where(Job.status == 'dead')
+                                          .values(status='pending', attempts=0, run_at=_utcnow(), finished=None))
+                await db.commit()
+                print(f'Перезапущено мертвых задач: {result.rowcount}')
+            counts = (await db.execute(select(Job.kind, Job.status, func.count()).group_by(Job.kind, Job.status))).all()
+            for kind, status, count in counts:
+                print(f'{kind:20} {status:10} {count}')
+            for job in await db.scalars(select(Job).where(Job.status == 'dead').order_by(Job.id.desc()).limit(10)):
+                print(f'dead #{job.id} {job.kind}: {job.last_error}')
+
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+'''Отправка писем через фоновые задачи (backend/jobs.py).
+Обработчик запроса вызывает queue_email и не ждет SMTP-сервер: письмо отправляет воркер,
+а при ошибке сервера отправка повторяется с задержкой. Настройки SMTP - MAIL_* в backend/config.py.'''
+
+import os
+import sys
+from typing import List
+
+from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from backend.jobs import enqueue, job_handler
+
+
+def mail_config() -> ConnectionConfig:
+    return ConnectionConfig(
+        MAIL_USERNAME=config.MAIL_USERNAME,
+        MAIL_PASSWORD=config.MAIL_PASSWORD,
+        MAIL_FROM=config.MAIL_FROM,
+        MAIL_FROM_NAME=config.MAIL_FROM_NAME,
+        MAIL_PORT=config.MAIL_PORT,
+        MAIL_SERVER=config.MAIL_SERVER,
+        MAIL_STARTTLS=config.MAIL_STARTTLS,
+        MAIL_SSL_TLS=config.MAIL_SSL_TLS,
+        USE_CREDENTIALS=bool(config.MAIL_USERNAME),
+        TIMEOUT=config.MAIL_TIMEOUT,
+    )
+
+
+@job_handler('send_email')
+async def send_email(payload: dict) -> None:
+    message = MessageSchema(
+        subject=payload['subject'],
+        recipients=payload['recipients'],
+        body=payload['body'],
+        subtype=MessageType.plain,
+    )
+    await FastMail(mail_config()).send_message(message)
+
+
+# Письмо в очередь фоновых задач, возвращает id задачи
+async def queue_email(db: AsyncSession, recipients: List[str], subject: str, body: str) -> int:
+    return await enqueue(db, 'send_email', {'recipients': recipients, 'subject': subject, 'body': body})
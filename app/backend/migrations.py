@@ -0,0 +1,136 @@
+'''Подготовка схемы базы данных при запуске приложения.
+Вместо удаления и пересоздания всех таблиц на каждом старте применяются только недостающие миграции Alembic.
+Ревизия head кэшируется в файле (config.SCHEMA_CACHE_FILE) вместе с подписью папки миграций,
+поэтому если база уже актуальна, запуск стоит одного запроса SELECT к alembic_version без загрузки Alembic.
+Полный сброс базы (delete_tables + create_tables) выполняется только при DB_RESET_ON_STARTUP=1, для разработки.'''
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from typing import Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import make_url
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from backend.db import create_tables, delete_tables, engine
+
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+ALEMBIC_INI = os.path.join(PROJECT_DIR, 'alembic.ini')
+MIGRATIONS_DIR = os.path.join(PROJECT_DIR, 'app', 'migrations')
+VERSIONS_DIR = os.path.join(MIGRATIONS_DIR, 'versions')
+
+
+# Синхронный адрес базы для Alembic (sqlite+aiosqlite -> sqlite, postgresql+asyncpg -> postgresql)
+def sync_database_url(url: str = config.DATABASE_URL) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=parsed.get_backend_name()).render_as_string(hide_password=False)
+
+
+def alembic_config():
+    from alembic.config import Config
+
+    cfg = Config(ALEMBIC_INI)
+    cfg.set_main_option('script_location', MIGRATIONS_DIR)
+    cfg.set_main_option('sqlalchemy.url', sync_database_url())
+    cfg.attributes['database_url_set'] = True  # env.py не подменяет адрес
+    # не перенастраивать логирование приложения (uvicorn) из env.py
+    cfg.attributes['configure_logger'] = False
+    return cfg
+
+
+# Подпись папки миграций: меняется при добавлении или изменении файла ревизии
+def _versions_signature() -> str:
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(VERSIONS_DIR)):
+        if name.endswith('.py'):
+            digest.update(name.encode())
+            digest.update(str(os.path.getmtime(os.path.join(VERSIONS_DIR, name))).encode())
+    return digest.hexdigest()
+
+
+def _cached_head(signature: str) -> Optional[str]:
+    try:
+        with open(config.SCHEMA_CACHE_FILE) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('signature') != signature:
+        return None
+    return cached.get('head')
+
+
+def _store_head(signature: str, head: str) -> None:
+    try:
+        with open(config.SCHEMA_CACHE_FILE, 'w') as f:
+            json.dump({'signature': signature, 'head': head}, f)
+    except OSError:
+        pass
+
+
+def _script_heads() -> tuple:
+    from alembic.script import ScriptDirectory
+
+    script = ScriptDirectory.from_config(alembic_config())
+    return script.get_current_head(), script.get_base()
+
+
+# Текущая ревизия базы и признак того, что таблицы уже созданы (например, через create_all без Alembic)
+async def _database_state() -> tuple:
+    def read(sync_conn):
+        tables = inspect(sync_conn).get_table_names()
+        if 'alembic_version' not in tables:
+            return None, bool(tables)
+        revision = sync_conn.execute(text('SELECT version_num FROM alembic_version')).scalar()
+        return revision, True
+
+    async with engine.connect() as conn:
+        return await conn.run_sync(read)
+
+
+def _upgrade(stamp_base: Optional[str]) -> None:
+    from alembic import command
+
+    cfg = alembic_config()
+    if stamp_base:
+        # база создана без Alembic: считаем, что начальная миграция уже применена
+        command.stamp(cfg, stamp_base)
+    command.upgrade(cfg, 'head')
+
+
+def _stamp_head() -> None:
+    from alembic import command
+
+    command.stamp(alembic_config(), 'head')
+
+
+'''Вызывается из lifespan приложения. Возвращает строку с описанием выполненного действия.'''
+
+async def prepare_database() -> str:
+    if config.DB_RESET_ON_STARTUP:
+        await delete_tables()
+        await create_tables()
+        await asyncio.to_thread(_stamp_head)
+        return 'База очищена и создана заново'
+
+    if not config.DB_MIGRATE_ON_STARTUP:
+        return 'Проверка схемы отключена'
+
+    signature = _versions_signature()
+    current, has_tables = await _database_state()
+    head = _cached_head(signature)
+    if head is not None and current == head:
+        return 'Схема базы актуальна'
+
+    head, base = await asyncio.to_thread(_script_heads)
+    _store_head(signature, head)
+    if current == head:
+        return 'Схема базы актуальна'
+
+    stamp_base = base if current is None and has_tables else None
+    await asyncio.to_thread(_upgrade, stamp_base)
+    return f'Применены миграции до ревизии {head}'
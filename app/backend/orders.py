@@ -0,0 +1,105 @@
+'''Оформление заказа из корзины.
+Раньше "покупка" только добавляла товар в корзину: остатков не было, таблица user_store не заполнялась.
+Теперь заказ оформляется одной транзакцией:
+- остаток каждого товара списывается условным UPDATE store SET stock = stock - :qty WHERE id = :id AND stock >= :qty
+  RETURNING cost - проверка и списание выполняются базой атомарно, параллельные покупатели не могут продать
+  больше, чем есть на складе (без SELECT ... FOR UPDATE и без блокировок в приложении);
+- товары обходятся в порядке id, поэтому в PostgreSQL параллельные заказы блокируют строки в одном порядке
+  и не попадают во взаимную блокировку;
+- если какого-то товара не хватает, транзакция откатывается целиком и возвращается список таких товаров;
+  товары, снятые с продажи (store.deleted_at), удаляются из корзины и возвращаются отдельным списком;
+- строки заказа и связи покупателя с товарами (user_store) вставляются пачкой, корзина очищается в той же транзакции.
+В SQLite запись в базу выполняет один писатель за раз: первым запросом транзакции идет UPDATE, поэтому
+ожидание блокировки укладывается в busy_timeout, а если его не хватило ("database is locked"),
+оформление повторяется до CHECKOUT_RETRIES раз.
+Проверка под нагрузкой: python scripts/checkout_check.py'''
+
+import asyncio
+import os
+import sys
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from backend.cart import cart_store
+from models.store import Order, OrderLine, Store, UserStore
+
+
+class OutOfStock(Exception):
+    '''Остатка не хватает для товаров product_ids, заказ не создан.
+    removed_ids - товары, снятые с продажи: они уже удалены из корзины.'''
+
+    def __init__(self, product_ids: List[int], removed_ids: Optional[List[int]] = None):
+        super().__init__(f'Недостаточно товара на складе: {product_ids}, сняты с продажи: {removed_ids or []}')
+        self.product_ids = product_ids
+        self.removed_ids = removed_ids or []
+
+
+async def _place_order(db: AsyncSession, cart_id: str, user_id: Optional[int], quantities: Dict[int, int]) -> Order:
+    prices: Dict[int, int] = {}
+    unavailable = []
+    for product_id in sorted(quantities):
+        result = await db.execute(
+            update(Store)
+            .where(Store.id == product_id, Store.deleted_at.is_(None), Store.stock >= quantities[product_id])
+            .values(stock=Store.stock - quantities[product_id])
+            .returning(Store.cost)
+            .execution_options(synchronize_session=False)
+        )
+        row = result.first()
+        if row is None:
+            unavailable.append(product_id)
+        else:
+            prices[product_id] = row.cost or 0
+    if unavailable:
+        await db.rollback()
+        # снятые с продажи товары убираются из корзины, иначе эту корзину не оформить никогда
+        on_sale = set(await db.scalars(
+            select(Store.id).where(Store.id.in_(unavailable), Store.deleted_at.is_(None))))
+        removed = [product_id for product_id in unavailable if product_id not in on_sale]
+        for product_id in removed:
+            await cart_store.remove(db, cart_id, product_id)
+        raise OutOfStock([product_id for product_id in unavailable if product_id in on_sale], removed)
+
+    order = Order(user_id=user_id, status='new',
+                  total_cost=sum(prices[product_id] * quantity for product_id, quantity in quantities.items()))
+    db.add(order)
+    await db.flush()
+    await db.execute(insert(OrderLine), [
+        {'order_id': order.id, 'store_id': product_id, 'quantity': quantity, 'price': prices[product_id]}
+        for product_id, quantity in sorted(quantities.items())
+    ])
+    if user_id is not None:
+        # повторная покупка того же товара не должна нарушать первичный ключ (user_id, store_id)
+        insert_or_ignore = postgresql_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+        await db.execute(
+            insert_or_ignore(UserStore)
+            .values([{'user_id': user_id, 'store_id': product_id} for product_id in sorted(quantities)])
+            .on_conflict_do_nothing(index_elements=[UserStore.user_id, UserStore.store_id])
+        )
+    await cart_store.clear(db, cart_id, commit=False)
+    await db.commit()
+    return order
+
+
+'''Оформление корзины cart_id: возвращает созданный заказ или None для пустой корзины.
+Если остатка не хватает или товары сняты с продажи, заказ не создается и выбрасывается OutOfStock.'''
+
+async def place_order(db: AsyncSession, cart_id: str, user_id: Optional[int] = None) -> Optional[Order]:
+    quantities = await cart_store.items(db, cart_id)
+    if not quantities:
+        return None
+    for attempt in range(config.CHECKOUT_RETRIES + 1):
+        try:
+            return await _place_order(db, cart_id, user_id, quantities)
+        except OperationalError:
+            await db.rollback()
+            if attempt == config.CHECKOUT_RETRIES:
+                raise
+            await asyncio.sleep(0.05 * (attempt + 1))
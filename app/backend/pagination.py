@@ -0,0 +1,125 @@
+'''Курсорная (keyset) пагинация и кэш количества записей.
+Вместо LIMIT/OFFSET страница определяется ключом последней показанной записи:
+запрос "WHERE key > :cursor ORDER BY key LIMIT n" идет по индексу и работает одинаково быстро
+для первой и для тысячной страницы. Курсор передается клиенту как непрозрачная строка (after / before).'''
+
+import base64
+import json
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# кодирование значения ключа в непрозрачную строку для URL
+def encode_cursor(values: Sequence[Any]) -> str:
+    prepared = [v.isoformat() if isinstance(v, (datetime, date)) else v for v in values]
+    raw = json.dumps(prepared, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+# обратное преобразование, типы восстанавливаются по колонкам ключа
+def decode_cursor(token: str, columns: Sequence[Any]) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(token)
+        decoded = []
+        for value, column in zip(values, columns):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+# курсор записи row по колонкам ключа; так же строятся курсоры для ссылок со страниц LIMIT/OFFSET
+def row_cursor(row, columns: Sequence[Any]) -> str:
+    return encode_cursor([getattr(row, c.key) for c in columns])
+
+
+def _key(columns: Sequence[Any]):
+    return columns[0] if len(columns) == 1 else tuple_(*columns)
+
+
+def _bound(columns: Sequence[Any], values: Sequence[Any]):
+    return values[0] if len(columns) == 1 else tuple_(*values)
+
+
+'''Возвращает (записи, курсор следующей страницы, курсор предыдущей страницы).
+columns - колонки ключа сортировки, последней должна идти уникальная (обычно id) для однозначности.
+descending=True - лента "сначала новые" (например, посты по дате публикации).
+Запрашивается size + 1 строка, чтобы без COUNT узнать, есть ли следующая страница.'''
+
+async def keyset_page(db: AsyncSession,
+                      query: Select,
+                      columns: Sequence[Any],
+                      size: int,
+                      after: Optional[str] = None,
+                      before: Optional[str] = None,
+                      descending: bool = False,
+                      scalars: bool = True) -> Tuple[list, Optional[str], Optional[str]]:
+    key = _key(columns)
+    backwards = before is not None
+
+    if after is not None:
+        bound = _bound(columns, decode_cursor(after, columns))
+        query = query.where(key < bound if descending else key > bound)
+    elif before is not None:
+        bound = _bound(columns, decode_cursor(before, columns))
+        query = query.where(key > bound if descending else key < bound)
+
+    # при движении назад сортировка разворачивается, а результат переворачивается обратно
+    ascending = descending == backwards
+    query = query.order_by(*[c.asc() if ascending else c.desc() for c in columns]).limit(size + 1)
+
+    result = await db.execute(query)
+    rows = list(result.scalars() if scalars else result.all())
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return rows, None, None
+
+    if backwards:
+        next_cursor = row_cursor(rows[-1], columns)
+        prev_cursor = row_cursor(rows[0], columns) if has_more else None
+    else:
+        next_cursor = row_cursor(rows[-1], columns) if has_more else None
+        prev_cursor = row_cursor(rows[0], columns) if after is not None else None
+    return rows, next_cursor, prev_cursor
+
+
+'''Кэш количества записей: точный COUNT(*) по большой таблице выполняется не на каждый запрос,
+а не чаще одного раза в ttl секунд. Админка сбрасывает значение после изменения данных.'''
+
+class CountCache:
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._values: Dict[str, Tuple[float, int]] = {}
+
+    async def get(self, db: AsyncSession, key: str, query: Select) -> int:
+        cached = self._values.get(key)
+        now = time.monotonic()
+        if cached is not None and now - cached[0] < self.ttl:
+            return cached[1]
+        value = await db.scalar(select(func.count()).select_from(query.subquery())) or 0
+        self._values[key] = (now, value)
+        return value
+
+    def invalidate(self, prefix: str = '') -> None:
+        for key in [k for k in self._values if k.startswith(prefix)]:
+            del self._values[key]
+
+
+count_cache = CountCache()
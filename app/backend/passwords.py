@@ -0,0 +1,56 @@
+'''Хеширование паролей вне цикла событий.
+bcrypt тратит 100-300 мс процессорного времени на один хеш, и вызов pwd_context.hash прямо в async-обработчике
+останавливает весь сервер на это время. Здесь хеширование и проверка выполняются в ограниченном пуле потоков
+(bcrypt освобождает GIL, поэтому потоки действительно работают параллельно), а обработчики только ждут результат.
+Стоимость (число раундов) задается в config.BCRYPT_ROUNDS; при ее изменении старые хеши
+пересчитываются при следующем успешном входе пользователя.'''
+
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=config.BCRYPT_ROUNDS)
+
+_executor = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+
+
+async def _run(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed: Optional[str]) -> bool:
+    if not hashed:
+        return False
+    return await _run(pwd_context.verify, password, hashed)
+
+
+# Проверка пароля; если хеш устарел (другая стоимость или схема), возвращается новый хеш
+async def verify_and_update(password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+    if not hashed:
+        return False, None
+    return await _run(pwd_context.verify_and_update, password, hashed)
+
+
+'''Проверка пароля пользователя при входе. При успешной проверке устаревший хеш
+незаметно для пользователя заменяется новым и сохраняется в базе.'''
+
+async def check_user_password(db: AsyncSession, user, password: str) -> bool:
+    valid, new_hash = await verify_and_update(password, user.password)
+    if valid and new_hash:
+        user.password = new_hash
+        await db.commit()
+    return valid
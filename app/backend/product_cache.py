@@ -0,0 +1,109 @@
+'''Кэш товаров каталога в памяти процесса (read-through).
+Добавление в корзину и просмотр корзины каждый раз читали строки Store по id, хотя товары меняются редко.
+Теперь строки берутся из кэша, а в базу уходят только отсутствующие id - одним запросом Store.id IN (...):
+- размер ограничен (PRODUCT_CACHE_MAX_ENTRIES), вытесняются давно не использованные записи (LRU);
+- запись живет PRODUCT_CACHE_TTL секунд - столько максимум может устареть товар в других процессах,
+  если приложение запущено несколькими воркерами;
+- админка после изменения товара вызывает invalidate: записи удаляются и увеличивается номер версии.
+  Запрос, начавший чтение из базы до изменения, видит другую версию и не сохраняет прочитанные строки;
+- отсутствующие в базе id тоже запоминаются, повторная попытка купить несуществующий товар не идет в базу;
+- попадания и промахи доступны в /metrics (render_prometheus).
+В кэше лежат строки результата (колонки PRODUCT_COLUMNS), а не объекты ORM: они не привязаны к сессии
+и не меняются, поэтому их можно безопасно отдавать разным запросам.'''
+
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from models.store import Store
+
+
+PRODUCT_COLUMNS = (Store.id, Store.title, Store.size, Store.description, Store.cost, Store.photo, Store.uploaded_at)
+
+
+class ProductCache:
+    def __init__(self, max_entries: int = config.PRODUCT_CACHE_MAX_ENTRIES, ttl: float = config.PRODUCT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[int, Tuple[float, Optional[Any]]]' = OrderedDict()  # id -> (срок, строка или None)
+        self.version = 0  # увеличивается при каждом изменении каталога
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, db: AsyncSession, product_id: int) -> Optional[Any]:
+        return (await self.get_many(db, [product_id])).get(product_id)
+
+    # Товары по списку id: {id: строка}, отсутствующих в базе id в результате нет
+    async def get_many(self, db: AsyncSession, product_ids: Iterable[int]) -> Dict[int, Any]:
+        now = time.monotonic()
+        product_ids = list(dict.fromkeys(product_ids))
+        found: Dict[int, Any] = {}
+        missing = []
+        for product_id in product_ids:
+            entry = self._entries.get(product_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(product_id)
+                if entry[1] is not None:
+                    found[product_id] = entry[1]
+            else:
+                missing.append(product_id)
+        self.hits += len(product_ids) - len(missing)
+        self.misses += len(missing)
+        if not missing:
+            return found
+
+        version = self.version
+        result = await db.execute(select(*PRODUCT_COLUMNS).where(Store.id.in_(missing), Store.deleted_at.is_(None)))
+        loaded = {row.id: row for row in result}
+        found.update(loaded)
+        if version == self.version:  # каталог не менялся, пока шел запрос
+            expires = time.monotonic() + self.ttl
+            for product_id in missing:
+                self._entries[product_id] = (expires, loaded.get(product_id))
+                self._entries.move_to_end(product_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return found
+
+    # Вызывается из админки после изменения товаров; без аргументов - сброс всего каталога (например, после импорта)
+    def invalidate(self, *product_ids: int) -> None:
+        self.version += 1
+        if not product_ids:
+            self._entries.clear()
+            return
+        for product_id in product_ids:
+            self._entries.pop(product_id, None)
+
+
+product_cache = ProductCache()
+
+
+# метрики кэша товаров в текстовом формате Prometheus (добавляются к /metrics)
+def render_prometheus() -> str:
+    lines = [
+        '# HELP product_cache_hits_total Product lookups served from the in-process cache.',
+        '# TYPE product_cache_hits_total counter',
+        f'product_cache_hits_total {product_cache.hits}',
+        '# HELP product_cache_misses_total Product lookups that went to the database.',
+        '# TYPE product_cache_misses_total counter',
+        f'product_cache_misses_total {product_cache.misses}',
+        '# HELP product_cache_evictions_total Products evicted from the cache by the size limit.',
+        '# TYPE product_cache_evictions_total counter',
+        f'product_cache_evictions_total {product_cache.evictions}',
+        '# HELP product_cache_entries Products currently held in the cache.',
+        '# TYPE product_cache_entries gauge',
+        f'product_cache_entries {len(product_cache)}',
+    ]
+    return '\n'.join(lines) + '\n'
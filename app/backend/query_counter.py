@@ -0,0 +1,44 @@
+'''Подсчет SQL-запросов, выполненных внутри блока кода.
+Обработчик события before_cursor_execute подключен ко всем движкам SQLAlchemy (класс Engine),
+поэтому считаются и запросы AsyncSession. Активные счетчики хранятся в ContextVar: считаются только запросы
+задачи, открывшей блок (и задач, созданных внутри него), а запросы фоновых обработчиков (очередь комментариев,
+фоновые задачи), запущенных раньше, в счетчик не попадают.
+Используется для проверки бюджета запросов (scripts/query_budget.py):
+    with count_queries() as counter:
+        await client.get('/posts/')
+    print(counter.count, counter.statements)'''
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements: List[str] = []
+
+
+# активные счетчики текущего контекста (вложенные блоки считают одни и те же запросы);
+# SQLAlchemy выполняет запросы AsyncSession в greenlet с контекстом вызывающей задачи, поэтому значение видно в событии
+_active: ContextVar[Tuple[QueryCounter, ...]] = ContextVar('query_counters', default=())
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active.get():
+        counter.count += 1
+        counter.statements.append(statement)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    counter = QueryCounter()
+    token = _active.set(_active.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _active.reset(token)
@@ -0,0 +1,178 @@
+'''Полнотекстовый поиск по постам и товарам.
+SQLite: виртуальные таблицы FTS5 posts_fts (title, body, tags) и store_fts (title, description)
+с внешним содержимым (content=posts/store) - текст не дублируется, индекс обновляется триггерами
+на INSERT/UPDATE/DELETE, поэтому админке ничего делать не нужно. Товары, снятые с продажи (store.deleted_at),
+остаются в индексе и отсекаются условием запроса. Ранжирование - bm25, фрагменты - snippet().
+PostgreSQL: вычисляемая колонка search_vector (tsvector) с GIN-индексом, ранжирование ts_rank, фрагменты ts_headline.
+Для существующей базы индекс создается миграцией, при create_all (DB_RESET_ON_STARTUP) - через события metadata.'''
+
+import html
+import os
+import re
+import sys
+from typing import List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.db import Base
+
+
+# Объекты поиска создаются SQL-командами, а не моделями, поэтому autogenerate alembic не должен их трогать
+# (см. include_object в migrations/env.py): виртуальные таблицы FTS5, их служебные таблицы и, в PostgreSQL,
+# колонки search_vector с GIN-индексами.
+SEARCH_TABLES = ('posts_fts', 'store_fts')
+FTS5_SHADOW_SUFFIXES = ('_data', '_idx', '_content', '_docsize', '_config')
+SEARCH_COLUMN = 'search_vector'
+SEARCH_INDEXES = ('ix_posts_search_vector', 'ix_store_search_vector')
+_SEARCH_TABLE_NAMES = frozenset(
+    SEARCH_TABLES + tuple(table + suffix for table in SEARCH_TABLES for suffix in FTS5_SHADOW_SUFFIXES))
+
+
+def is_search_object(name: Optional[str], type_: str) -> bool:
+    if type_ == 'table':
+        return name in _SEARCH_TABLE_NAMES
+    if type_ == 'column':
+        return name == SEARCH_COLUMN
+    if type_ == 'index':
+        return name in SEARCH_INDEXES
+    return False
+
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, body, tags, content='posts', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, body, tags) VALUES (new.id, new.title, new.body, new.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ad AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, body, tags) VALUES ('delete', old.id, old.title, old.body, old.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_au AFTER UPDATE OF title, body, tags ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, body, tags) VALUES ('delete', old.id, old.title, old.body, old.tags);
+        INSERT INTO posts_fts(rowid, title, body, tags) VALUES (new.id, new.title, new.body, new.tags);
+    END""",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS store_fts USING fts5(title, description, content='store', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_ai AFTER INSERT ON store BEGIN
+        INSERT INTO store_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_ad AFTER DELETE ON store BEGIN
+        INSERT INTO store_fts(store_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_au AFTER UPDATE OF title, description ON store BEGIN
+        INSERT INTO store_fts(store_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO store_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    "INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')",
+    "INSERT INTO store_fts(store_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS posts_fts_ai",
+    "DROP TRIGGER IF EXISTS posts_fts_ad",
+    "DROP TRIGGER IF EXISTS posts_fts_au",
+    "DROP TRIGGER IF EXISTS store_fts_ai",
+    "DROP TRIGGER IF EXISTS store_fts_ad",
+    "DROP TRIGGER IF EXISTS store_fts_au",
+    "DROP TABLE IF EXISTS posts_fts",
+    "DROP TABLE IF EXISTS store_fts",
+]
+
+POSTGRESQL_CREATE = [
+    """ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(tags, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(body, '')), 'C')) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_posts_search_vector ON posts USING gin (search_vector)",
+    """ALTER TABLE store ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'C')) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_store_search_vector ON store USING gin (search_vector)",
+]
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    statements = {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRESQL_CREATE}.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Base.metadata, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    # в PostgreSQL колонки search_vector удаляются вместе с таблицами
+    if connection.dialect.name == 'sqlite':
+        for statement in SQLITE_DROP:
+            connection.exec_driver_sql(statement)
+
+
+# маркеры начала и конца совпадения во фрагменте, заменяются на <mark> после экранирования
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+
+def highlight(fragment: Optional[str]) -> str:
+    escaped = html.escape(fragment or '')
+    return escaped.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+'''Запрос пользователя превращается в безопасное выражение FTS5: берутся только слова,
+каждое в кавычках и с поиском по префиксу ("косм"* найдет "космос"), все слова обязательны.'''
+
+def fts_query(q: str) -> str:
+    words = re.findall(r'\w+', q)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+async def search_posts(db: AsyncSession, q: str, limit: int, offset: int = 0) -> List[dict]:
+    if db.bind.dialect.name == 'postgresql':
+        statement = text(f"""
+            SELECT p.id, p.title, p.slug, p.publish,
+                   ts_headline('simple', p.body, query, 'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords=30') AS snippet
+            FROM posts p, plainto_tsquery('simple', :q) AS query
+            WHERE p.search_vector @@ query AND p.published IS TRUE
+            ORDER BY ts_rank(p.search_vector, query) DESC, p.id
+            LIMIT :limit OFFSET :offset""")
+        params = {'q': q, 'limit': limit, 'offset': offset}
+    else:
+        match = fts_query(q)
+        if not match:
+            return []
+        statement = text(f"""
+            SELECT p.id, p.title, p.slug, p.publish,
+                   snippet(posts_fts, 1, '{_MARK_START}', '{_MARK_END}', '...', 20) AS snippet
+            FROM posts_fts JOIN posts p ON p.id = posts_fts.rowid
+            WHERE posts_fts MATCH :q AND p.published = 1
+            ORDER BY bm25(posts_fts, 10.0, 1.0, 5.0), p.id
+            LIMIT :limit OFFSET :offset""")
+        params = {'q': match, 'limit': limit, 'offset': offset}
+
+    result = await db.execute(statement, params)
+    return [dict(row._mapping, snippet=highlight(row.snippet)) for row in result]
+
+
+async def search_products(db: AsyncSession, q: str, limit: int, offset: int = 0) -> List[dict]:
+    if db.bind.dialect.name == 'postgresql':
+        statement = text(f"""
+            SELECT s.id, s.title, s.cost, s.photo,
+                   ts_headline('simple', coalesce(s.description, ''), query, 'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords=30') AS snippet
+            FROM store s, plainto_tsquery('simple', :q) AS query
+            WHERE s.search_vector @@ query AND s.deleted_at IS NULL
+            ORDER BY ts_rank(s.search_vector, query) DESC, s.id
+            LIMIT :limit OFFSET :offset""")
+        params = {'q': q, 'limit': limit, 'offset': offset}
+    else:
+        match = fts_query(q)
+        if not match:
+            return []
+        statement = text(f"""
+            SELECT s.id, s.title, s.cost, s.photo,
+                   snippet(store_fts, 1, '{_MARK_START}', '{_MARK_END}', '...', 20) AS snippet
+            FROM store_fts JOIN store s ON s.id = store_fts.rowid
+            WHERE store_fts MATCH :q AND s.deleted_at IS NULL
+            ORDER BY bm25(store_fts, 10.0, 1.0), s.id
+            LIMIT :limit OFFSET :offset""")
+        params = {'q': match, 'limit': limit, 'offset': offset}
+
+    result = await db.execute(statement, params)
+    return [dict(row._mapping, snippet=highlight(row.snippet)) for row in result]
@@ -0,0 +1,60 @@
+'''Сериализация ответов JSON API (/api/v1) прямо из строк запроса.
+Строки результата (Row) проверяются и записываются в байты JSON заранее собранным TypeAdapter pydantic v2
+(ядро на Rust): без объектов ORM, без промежуточного dict на каждую строку и без json.dumps.
+- выбор полей (?fields=id,title): в SELECT попадают только нужные колонки (плюс ключ сортировки),
+  а адаптер собирается для модели только с этими полями;
+- адаптеры собираются один раз на модель и набор полей и хранятся в кэше (_adapter).
+Условные запросы (ETag / If-None-Match -> 304) - в backend/cache.py.'''
+
+import functools
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter, create_model
+
+
+JSON_MEDIA_TYPE = 'application/json'
+
+
+'''Разбор параметра fields: имена полей через запятую в порядке полей модели.
+Пустой параметр - поля default (по умолчанию все поля модели), неизвестное поле - ошибка 400.'''
+
+def parse_fields(model: Type[BaseModel], fields: Optional[str],
+                 default: Optional[Sequence[str]] = None) -> Tuple[str, ...]:
+    if not fields:
+        return tuple(default or model.model_fields)
+    names = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = sorted(names - set(model.model_fields))
+    if unknown or not names:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown fields: {', '.join(unknown)}")
+    return tuple(name for name in model.model_fields if name in names)
+
+
+# Колонки запроса для выбранных полей; required - колонки, нужные всегда (например, ключ курсора)
+def select_columns(columns: Dict[str, Any], fields: Iterable[str], *required) -> list:
+    selected = [columns[name] for name in fields if name in columns]
+    return selected + [column for column in required if not any(column is c for c in selected)]
+
+
+@functools.lru_cache(maxsize=256)
+def _adapter(model: Type[BaseModel], fields: Tuple[str, ...], envelope=None) -> TypeAdapter:
+    item = model
+    if fields != tuple(model.model_fields):
+        item = create_model(model.__name__, __config__=model.model_config,
+                            **{name: (info.annotation, info) for name, info in model.model_fields.items()
+                               if name in fields})
+    return TypeAdapter(envelope[item] if envelope is not None else item)
+
+
+'''Байты JSON для data: одна запись (строка, объект, dict) или, если указан envelope (ApiPage, ApiCart),
+dict с ключами обертки, где items - список строк запроса.'''
+
+def dump_json(model: Type[BaseModel], fields: Tuple[str, ...], data: Any, envelope=None) -> bytes:
+    adapter = _adapter(model, fields, envelope)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+
+def json_response(body: bytes, status_code: int = status.HTTP_200_OK) -> Response:
+    return Response(content=body, status_code=status_code, media_type=JSON_MEDIA_TYPE)
@@ -0,0 +1,237 @@
+'''Статические файлы с отпечатками содержимого и долгим кэшированием.
+Сборка (при запуске приложения или командой python app/backend/static_assets.py):
+- каждый файл из app/static копируется в STATIC_BUILD_DIR под именем с хешем содержимого:
+  store/store.css -> store/store.1a2b3c4d5e.css;
+- в CSS ссылки url('/static/...') заменяются на адреса с хешем (поэтому CSS обрабатываются после картинок);
+- для текстовых файлов рядом сохраняются сжатые варианты .gz и .br (brotli - если установлен пакет brotli);
+- соответствие имен записывается в manifest.json;
+- файлы STATIC_KEEP_BUILDS последних сборок (список в builds.json) остаются в папке и продолжают отдаваться:
+  во время поэтапного деплоя страницы старых экземпляров ссылаются на прежние хеши. Файлы более старых сборок
+  удаляются; вся папка очищается только командой с --clean.
+В шаблонах url_for('static', path='store/store.css') возвращает адрес с хешем (см. backend/templates.py).
+Файл с хешем никогда не меняется, поэтому отдается с Cache-Control: immutable на год и браузер
+не перепроверяет его при каждом просмотре страницы; после изменения файла меняется и адрес.
+Ответ - FileResponse: сервер с поддержкой расширения ASGI http.response.pathsend (Hypercorn, Granian)
+отправляет файл без копирования через пользовательское пространство (sendfile), uvicorn - частями.
+За nginx папку сборки можно отдавать напрямую (sendfile on; gzip_static on; brotli_static on).'''
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+
+try:
+    import brotli
+except ImportError:  # сжатие brotli необязательно, без пакета сохраняется только .gz
+    brotli = None
+
+
+MANIFEST_FILE = 'manifest.json'
+HISTORY_FILE = 'builds.json'  # имена файлов с хешем последних сборок, сначала текущая
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)/static/([^'")?#\s]+)\1\s*\)''')
+
+
+class StaticAssets:
+    def __init__(self, source: str = config.STATIC_DIR, build: str = config.STATIC_BUILD_DIR):
+        self.source = source
+        self.build_dir = build
+        self.manifest: Dict[str, str] = {}  # исходное имя -> имя с хешем
+        self.hashed: Dict[str, str] = {}  # имя с хешем -> файл в папке сборки
+        self.encodings: Dict[str, Tuple[str, ...]] = {}  # имя с хешем -> готовые сжатые варианты ('br', 'gzip')
+
+    # адрес файла с хешем; неизвестные файлы (или сборка не выполнялась) - исходный адрес
+    def url_path(self, path: str) -> str:
+        return self.manifest.get(path.lstrip('/'), path)
+
+    def build(self) -> str:
+        os.makedirs(self.build_dir, exist_ok=True)
+        names = []
+        for root, _, files in os.walk(self.source):
+            for file_name in files:
+                if not file_name.startswith('.'):
+                    names.append(os.path.relpath(os.path.join(root, file_name), self.source).replace(os.sep, '/'))
+        # CSS - в конце: ссылки на картинки заменяются уже известными адресами с хешем
+        names.sort(key=lambda name: (name.endswith('.css'), name))
+
+        manifest = {}
+        compressed = 0
+        for name in names:
+            with open(os.path.join(self.source, name), 'rb') as file:
+                content = file.read()
+            if name.endswith('.css'):
+                content = self._rewrite_css(content, manifest)
+            stem, extension = os.path.splitext(name)
+            hashed = f'{stem}.{hashlib.sha256(content).hexdigest()[:10]}{extension}'
+            manifest[name] = hashed
+            target = os.path.join(self.build_dir, hashed)
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as file:
+                    file.write(content)
+            if extension in COMPRESSIBLE:
+                compressed += self._compress(target, content)
+
+        current = sorted(manifest.values())
+        builds = [current] + [names for names in self._read(HISTORY_FILE, []) if names != current]
+        builds = builds[:max(config.STATIC_KEEP_BUILDS, 1)]
+        self._prune(builds)
+        with open(os.path.join(self.build_dir, MANIFEST_FILE), 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, ensure_ascii=False, indent=2)
+        with open(os.path.join(self.build_dir, HISTORY_FILE), 'w', encoding='utf-8') as file:
+            json.dump(builds, file, ensure_ascii=False)
+        self._use(manifest, builds)
+        return f'Статика: {len(manifest)} файлов с хешем, сжатых вариантов: {compressed}'
+
+    # чтение manifest.json готовой сборки (например, собранной заранее при деплое)
+    def load(self) -> bool:
+        manifest = self._read(MANIFEST_FILE, None)
+        if manifest is None:
+            return False
+        self._use(manifest, self._read(HISTORY_FILE, []))
+        return True
+
+    def _read(self, file_name: str, default):
+        try:
+            with open(os.path.join(self.build_dir, file_name), encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return default
+
+    # адреса текущей сборки - в manifest, файлы прошлых сборок из builds отдаются по их именам с хешем
+    def _use(self, manifest: Dict[str, str], builds: List[List[str]]) -> None:
+        self.manifest = manifest
+        names = set(manifest.values()).union(*builds)
+        self.hashed = {hashed: os.path.join(self.build_dir, hashed) for hashed in names
+                       if os.path.exists(os.path.join(self.build_dir, hashed))}
+        # наличие сжатых вариантов проверяется один раз, а не при каждом запросе
+        self.encodings = {
+            hashed: tuple(encoding for encoding, suffix in (('br', '.br'), ('gzip', '.gz'))
+                          if os.path.exists(path + suffix))
+            for hashed, path in self.hashed.items()
+        }
+
+    @staticmethod
+    def _rewrite_css(content: bytes, manifest: Dict[str, str]) -> bytes:
+        def replace(match):
+            return f"url({match.group(1)}/static/{manifest.get(match.group(2), match.group(2))}{match.group(1)})"
+        return _CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+    @staticmethod
+    def _compress(target: str, content: bytes) -> int:
+        count = 0
+        if not os.path.exists(target + '.gz'):
+            with open(target + '.gz', 'wb') as file:
+                file.write(gzip.compress(content, compresslevel=9, mtime=0))
+        count += 1
+        if brotli is not None:
+            if not os.path.exists(target + '.br'):
+                with open(target + '.br', 'wb') as file:
+                    file.write(brotli.compress(content, quality=11))
+            count += 1
+        return count
+
+    # удаление файлов сборок старше последних STATIC_KEEP_BUILDS
+    def _prune(self, builds: List[List[str]]) -> None:
+        keep = {os.path.normpath(os.path.join(self.build_dir, hashed + suffix))
+                for names in builds for hashed in names for suffix in ('', '.gz', '.br')}
+        keep.add(os.path.normpath(os.path.join(self.build_dir, MANIFEST_FILE)))
+        keep.add(os.path.normpath(os.path.join(self.build_dir, HISTORY_FILE)))
+        for root, _, files in os.walk(self.build_dir):
+            for file_name in files:
+                path = os.path.normpath(os.path.join(root, file_name))
+                if path not in keep:
+                    os.remove(path)
+
+
+assets = StaticAssets()
+
+
+# Сборка при запуске приложения (STATIC_BUILD_ON_STARTUP=0 - только чтение готового manifest.json)
+def prepare_static_assets() -> str:
+    if config.STATIC_BUILD_ON_STARTUP:
+        return assets.build()
+    if assets.load():
+        return f'Статика: {len(assets.manifest)} файлов с хешем (готовая сборка)'
+    return 'Статика: сборка не найдена, файлы отдаются без хешей'
+
+
+'''StaticFiles, который отдает файлы с хешем из папки сборки: Cache-Control immutable на STATIC_MAX_AGE секунд
+и сжатый вариант по заголовку Accept-Encoding. Адреса без хеша обслуживаются как раньше (ETag и перепроверка).'''
+
+class FingerprintedStaticFiles(StaticFiles):
+    def __init__(self, *args, assets: StaticAssets = assets, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.assets = assets
+
+    async def get_response(self, path: str, scope) -> Response:
+        name = path.replace(os.sep, '/')
+        file_path = self.assets.hashed.get(name)
+        if file_path is None or scope['method'] not in ('GET', 'HEAD'):
+            return await super().get_response(path, scope)
+
+        headers = {
+            'Cache-Control': f'public, max-age={config.STATIC_MAX_AGE}, immutable',
+            'Vary': 'Accept-Encoding',
+        }
+        media_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        encoding = self._encoding(scope, self.assets.encodings.get(name, ()))
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+            file_path += '.br' if encoding == 'br' else '.gz'
+        return FileResponse(file_path, headers=headers, media_type=media_type)
+
+    # готовый вариант с наибольшим q из Accept-Encoding (при равном q br лучше gzip); q=0 - вариант запрещен
+    @staticmethod
+    def _encoding(scope, available: Tuple[str, ...]) -> Optional[str]:
+        if not available:
+            return None
+        accept = ''
+        for name, value in scope['headers']:
+            if name == b'accept-encoding':
+                accept = value.decode('latin-1')
+                break
+        weights = _accept_weights(accept)
+        best, best_q = None, 0.0
+        for encoding in available:
+            q = weights.get(encoding, weights.get('*', 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+
+# Разбор Accept-Encoding: "br;q=0, gzip;q=0.8, *;q=0.1" -> {'br': 0.0, 'gzip': 0.8, '*': 0.1}
+def _accept_weights(accept: str) -> Dict[str, float]:
+    weights = {}
+    for part in accept.split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    return weights
+
+
+if __name__ == '__main__':
+    if os.path.isdir(config.STATIC_BUILD_DIR) and '--clean' in sys.argv:
+        shutil.rmtree(config.STATIC_BUILD_DIR)
+    print(assets.build())
@@ -0,0 +1,146 @@
+'''Массовый импорт товаров из CSV или NDJSON (фид поставщика).
+Файл читается построчно и обрабатывается пачками по config.IMPORT_BATCH_SIZE:
+- строки проверяются схемой StoreImportRow, ошибки собираются с номером строки и не прерывают импорт;
+- дубликаты ищутся одним запросом на пачку (title IN (...)) и внутри самого файла;
+- новые товары вставляются одним executemany на пачку, каждая пачка - отдельная транзакция.
+Запуск из командной строки:
+    python app/backend/store_import.py feed.csv
+    python app/backend/store_import.py feed.ndjson'''
+
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from backend.db import SessionLocal
+from models.store import Store
+from schemas.schemas import StoreImportRow
+
+
+# сколько ошибок сохранять в отчете
+MAX_REPORTED_ERRORS = 1000
+
+
+# Чтение строк файла: (номер строки, словарь значений или текст ошибки разбора)
+def read_rows(stream: TextIO, file_format: str) -> Iterator[Tuple[int, Any]]:
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, f'Некорректный JSON: {e}'
+    else:
+        raise ValueError(f'Неизвестный формат файла: {file_format}')
+
+
+def detect_format(filename: str) -> str:
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def _batches(rows: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ImportReport:
+    def __init__(self):
+        self.total = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+
+    def add_error(self, line: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': error})
+
+    def as_dict(self) -> Dict[str, Any]:
+        seconds = time.perf_counter() - self.started
+        return {
+            'total': self.total,
+            'inserted': self.inserted,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(self.total / seconds, 1) if seconds else None,
+            'errors': self.errors,
+        }
+
+
+async def _import_batch(batch: list, seen_titles: set, report: ImportReport) -> None:
+    valid: Dict[str, dict] = {}
+    for line, raw in batch:
+        report.total += 1
+        if isinstance(raw, str):
+            report.add_error(line, raw)
+            continue
+        try:
+            row = StoreImportRow.model_validate(raw)
+        except ValidationError as e:
+            report.add_error(line, '; '.join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            continue
+        if row.title in seen_titles or row.title in valid:
+            report.duplicates += 1
+            continue
+        valid[row.title] = row.model_dump()
+
+    if not valid:
+        return
+
+    async with SessionLocal() as db:
+        # один запрос на всю пачку вместо SELECT на каждый товар
+        existing = set(await db.scalars(select(Store.title).where(Store.title.in_(list(valid)), Store.deleted_at.is_(None))))
+        rows = [row for title, row in valid.items() if title not in existing]
+        if rows:
+            await db.execute(insert(Store), rows)
+        await db.commit()
+
+    report.duplicates += len(existing)
+    report.inserted += len(rows)
+    seen_titles.update(valid)
+
+
+async def import_stream(stream: TextIO, file_format: str, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    report = ImportReport()
+    seen_titles: set = set()
+    for batch in _batches(read_rows(stream, file_format), batch_size or config.IMPORT_BATCH_SIZE):
+        await _import_batch(batch, seen_titles, report)
+    return report.as_dict()
+
+
+async def import_file(path: str) -> Dict[str, Any]:
+    with open(path, encoding='utf-8', newline='') as stream:
+        return await import_stream(stream, detect_format(path))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('Использование: python app/backend/store_import.py <файл.csv|файл.ndjson>')
+        sys.exit(2)
+    result = asyncio.run(import_file(sys.argv[1]))
+    errors = result.pop('errors')
+    for error in errors:
+        print(f"строка {error['line']}: {error['error']}")
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,62 @@
+'''Нормализованные теги постов и поиск похожих постов.
+Строка Post.tags ("космос, марс") раскладывается в таблицы tags и post_tags при создании и изменении поста.
+Похожие посты ранжируются в SQL по количеству общих тегов:
+post_tags (теги поста) -> post_tags (посты с теми же тегами, индекс tag_id, post_id) -> GROUP BY -> LIMIT,
+поэтому в память попадают только нужные 4 записи.'''
+
+import os
+import sys
+from typing import List, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.posts import Post, PostTag, Tag
+
+
+# "Космос, марс,,космос" -> ["космос", "марс"]
+def parse_tags(tags: Optional[str]) -> List[str]:
+    names = []
+    for name in (tags or '').split(','):
+        name = name.strip().lower()[:64]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+'''Синхронизация тегов поста со строкой тегов. Недостающие теги создаются одним INSERT ... ON CONFLICT DO NOTHING,
+идентификаторы читаются одним запросом, связи поста пересоздаются. Коммит выполняет вызывающий код.'''
+
+async def set_post_tags(db: AsyncSession, post_id: int, tags: Optional[str]) -> None:
+    names = parse_tags(tags)
+    await db.execute(delete(PostTag).where(PostTag.post_id == post_id))
+    if not names:
+        return
+
+    insert = postgresql_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+    await db.execute(insert(Tag).values([{'name': name} for name in names]).on_conflict_do_nothing(index_elements=[Tag.name]))
+    tag_ids = await db.scalars(select(Tag.id).where(Tag.name.in_(names)))
+    await db.execute(PostTag.__table__.insert(), [{'post_id': post_id, 'tag_id': tag_id} for tag_id in tag_ids])
+
+
+# Опубликованные посты с наибольшим числом общих тегов, при равенстве - более новые
+async def similar_posts(db: AsyncSession, post_id: int, limit: int = 4) -> list:
+    own = aliased(PostTag)
+    other = aliased(PostTag)
+    shared = func.count().label('shared_tags')
+    query = (
+        select(Post.id, Post.title, Post.slug, Post.publish, Post.image, shared)
+        .select_from(own)
+        .join(other, (other.tag_id == own.tag_id) & (other.post_id != own.post_id))
+        .join(Post, Post.id == other.post_id)
+        .where(own.post_id == post_id, Post.published.is_(True))
+        .group_by(Post.id, Post.title, Post.slug, Post.publish, Post.image)
+        .order_by(shared.desc(), Post.publish.desc())
+        .limit(limit)
+    )
+    result = await db.execute(query)
+    return result.all()
@@ -0,0 +1,86 @@
+'''Общее окружение шаблонов Jinja2 для всего приложения.
+Раньше каждый роутер создавал свой Jinja2Templates(directory="app/templates"): шаблоны загружались,
+разбирались и кэшировались в каждом модуле отдельно, а при каждом рендере проверялась дата изменения файла.
+Теперь окружение одно:
+- байткод скомпилированных шаблонов сохраняется на диск (TEMPLATES_CACHE_DIR), следующий запуск не разбирает их заново;
+- проверка изменений файлов (auto_reload) включается только для разработки: TEMPLATES_AUTO_RELOAD=1;
+- все шаблоны компилируются при запуске (warm_up_templates), первый запрос не платит за компиляцию;
+- рендеринг асинхронный (enable_async): await templates.render(...) не блокирует цикл событий на больших страницах;
+- url_for('static', path=...) возвращает адрес файла с хешем содержимого (backend/static_assets.py);
+- image_variants(photo) - миниатюры загруженных изображений для srcset (backend/images.py).'''
+
+import os
+import sys
+from typing import Optional
+
+import jinja2
+from fastapi.responses import HTMLResponse
+from fastapi.templating import Jinja2Templates
+from starlette.background import BackgroundTask
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import config
+from backend.images import image_variants
+from backend.static_assets import assets
+
+
+# url_for шаблонов: для статики подставляется имя файла с хешем (store/store.css -> store/store.1a2b3c4d5e.css)
+@jinja2.pass_context
+def url_for(context: dict, name: str, /, **path_params):
+    if name == 'static' and 'path' in path_params:
+        path_params['path'] = assets.url_path(path_params['path'])
+    return context['request'].url_for(name, **path_params)
+
+
+def create_environment() -> jinja2.Environment:
+    bytecode_cache = None
+    if config.TEMPLATES_CACHE_DIR:
+        os.makedirs(config.TEMPLATES_CACHE_DIR, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(config.TEMPLATES_CACHE_DIR)
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(config.TEMPLATES_DIR),
+        autoescape=True,
+        auto_reload=config.TEMPLATES_AUTO_RELOAD,
+        bytecode_cache=bytecode_cache,
+        enable_async=True,
+    )
+    env.globals['url_for'] = url_for  # Jinja2Templates не заменяет уже заданный url_for
+    env.globals['image_variants'] = image_variants  # данные для макроса picture (templates/images.html)
+    return env
+
+
+class AsyncTemplates(Jinja2Templates):
+    '''Jinja2Templates с асинхронным рендерингом: синхронный TemplateResponse с окружением enable_async
+    не работает внутри запущенного цикла событий, поэтому обработчики вызывают await templates.render(...).'''
+
+    async def render(self, name: str, context: dict, status_code: int = 200, headers: Optional[dict] = None,
+                     media_type: Optional[str] = None, background: Optional[BackgroundTask] = None) -> HTMLResponse:
+        request = context.get('request')
+        for processor in self.context_processors:
+            context.update(processor(request))
+        template = self.get_template(name)
+        content = await template.render_async(context)
+        response = HTMLResponse(content, status_code=status_code, headers=headers,
+                                media_type=media_type, background=background)
+        response.template = template
+        response.context = context
+        return response
+
+
+templates = AsyncTemplates(env=create_environment())
+
+
+# Компиляция всех шаблонов при запуске; ошибки синтаксиса не мешают запуску, но выводятся в сообщении
+def warm_up_templates() -> str:
+    compiled = 0
+    errors = []
+    for name in templates.env.list_templates(extensions=['html']):
+        try:
+            templates.env.get_template(name)
+            compiled += 1
+        except jinja2.TemplateSyntaxError as error:
+            errors.append(f'{name}:{error.lineno} {error.message}')
+    message = f'Шаблоны скомпилированы: {compiled}'
+    if errors:
+        message += '\nОшибки в шаблонах:\n    ' + '\n    '.join(errors)
+    return message
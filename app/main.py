@@ -1,28 +1,53 @@
+import asyncio
 from contextlib import asynccontextmanager
 import os
 import sys
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from .routers import admin, posts, sign_in, store
-from backend.db import create_tables, delete_tables
+from .routers import admin, api, metrics, posts, search, sign_in, store
+from backend import config
+from backend.cache import cache_page
+from backend.comment_queue import comment_queue
+from backend.comment_stats import reconcile_periodically
+from backend.db_metrics import QueryTimingMiddleware
+from backend.http_metrics import HttpMetricsMiddleware
+from backend.images import MediaFiles, shutdown_image_pool
+from backend.jobs import job_runner
+from backend.migrations import prepare_database
+from backend.static_assets import FingerprintedStaticFiles, prepare_static_assets
+from backend.templates import templates, warm_up_templates
 
 '''
-Удобное создание таблиц для отладки кода'''
+При запуске применяются только недостающие миграции, если схема актуальна - старт мгновенный.
+Для отладки можно очищать базу на каждом запуске: DB_RESET_ON_STARTUP=1 uvicorn app.main:app --reload'''
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await delete_tables()
-    print('База очищена')
-    await create_tables()
-    print('База создана и готова к работе')
+    print(await prepare_database())
+    print(prepare_static_assets())
+    print(warm_up_templates())
+    print('База готова к работе')
+    # периодическая сверка счетчиков комментариев постов (COMMENT_STATS_RECONCILE_INTERVAL=0 - отключена)
+    reconcile = None
+    if config.COMMENT_STATS_RECONCILE_INTERVAL > 0:
+        reconcile = asyncio.create_task(reconcile_periodically())
+    # фоновая запись комментариев пачками (COMMENT_QUEUE_ENABLED=0 - запись сразу в запросе)
+    if config.COMMENT_QUEUE_ENABLED:
+        comment_queue.start()
+    # воркеры фоновых задач: письма и другие медленные действия (JOBS_ENABLED=0 - задачи только копятся в таблице)
+    if config.JOBS_ENABLED:
+        job_runner.start()
     yield
+    await comment_queue.stop()  # принятые комментарии дописываются до выключения
+    await job_runner.stop()
+    if reconcile is not None:
+        reconcile.cancel()
+    shutdown_image_pool()
     print('Выключение')
     
 
@@ -30,19 +55,27 @@ app = FastAPI(lifespan=lifespan)
 
 
 # Укажите директорию для статических файлов
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# файлы с хешем в имени отдаются из папки сборки с Cache-Control: immutable и сжатыми вариантами
+app.mount("/static", FingerprintedStaticFiles(directory="app/static"), name="static")
+# загруженные в админке изображения и их миниатюры (путь содержит хеш содержимого)
+app.mount("/media", MediaFiles(directory=config.MEDIA_DIR, check_dir=False), name="media")
 
-# подключает директорию для обработки темплейда
-templates = Jinja2Templates(directory="app/templates")
 
 # Настройка SessionMiddleware
 app.add_middleware(SessionMiddleware, secret_key="260694")
 
+# Число SQL-запросов и время БД на каждый запрос: заголовок Server-Timing и /metrics
+app.add_middleware(QueryTimingMiddleware)
+
+# Задержка, размер ответа и коды ответов по маршрутам (/metrics), подключается последним - внешний слой
+app.add_middleware(HttpMetricsMiddleware)
+
 
 
 @app.get("/", response_class=HTMLResponse, name="primary")
+@cache_page("primary")
 async def primary(request: Request) -> dict:
-    return templates.TemplateResponse("store/primary.html", {"request": request})
+    return await templates.render("store/primary.html", {"request": request})
 
 
 #Подключение роутеров из других файлов
@@ -50,6 +83,9 @@ app.include_router(admin.router)
 app.include_router(store.router)
 app.include_router(posts.router)
 app.include_router(sign_in.router)
+app.include_router(search.router)
+app.include_router(metrics.router)
+app.include_router(api.router)
 
 
 # app = FastAPI(dependencies=[Depends(verify_token), Depends(verify_key)])
@@ -21,7 +21,8 @@ connectable = engine_from_config(
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-if config.config_file_name is not None:
+# При запуске из приложения (backend/migrations.py) логирование уже настроено
+if config.config_file_name is not None and config.attributes.get('configure_logger', True):
     fileConfig(config.config_file_name)
 
 # add your model's MetaData object here
@@ -30,10 +31,24 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from models.sign_in import User
 from models.posts import Post, Comment
 from models.store import Store
+from models.jobs import Job
 from backend.db import Base
+from backend.migrations import sync_database_url
+from backend.search import is_search_object
 
 target_metadata = Base.metadata
 
+# При запуске из командной строки (alembic upgrade head, alembic check) база - та же, что у приложения
+# (DATABASE_URL), а не адрес из alembic.ini. Приложение (backend/migrations.py) передает адрес само.
+if not config.attributes.get('database_url_set'):
+    config.set_main_option('sqlalchemy.url', sync_database_url())
+
+
+# Таблицы FTS5 (и их служебные таблицы) и search_vector создаются миграцией поиска, а не моделями:
+# без фильтра autogenerate предлагает их удалить
+def include_object(object, name, type_, reflected, compare_to):
+    return not (reflected and compare_to is None and is_search_object(name, type_))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -47,6 +62,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -62,7 +78,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
@@ -0,0 +1,49 @@
+"""Add orders, order lines and product stock
+
+Revision ID: a5c1e7b3d9f2
+Revises: f3a9d2c6e8b1
+Create Date: 2026-10-18 13:48:12.306915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5c1e7b3d9f2'
+down_revision: Union[str, None] = 'f3a9d2c6e8b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # у существующих товаров остаток 0: его задает администратор
+    op.add_column('store', sa.Column('stock', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('orders',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('total_cost', sa.Integer(), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_orders_user_id_created', 'orders', ['user_id', 'created'], unique=False)
+    op.create_table('order_lines',
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['store_id'], ['store.id'], ),
+    sa.PrimaryKeyConstraint('order_id', 'store_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('order_lines')
+    op.drop_index('ix_orders_user_id_created', table_name='orders')
+    op.drop_table('orders')
+    op.drop_column('store', 'stock')
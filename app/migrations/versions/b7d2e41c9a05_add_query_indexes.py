@@ -0,0 +1,36 @@
+"""Add query indexes
+
+Revision ID: b7d2e41c9a05
+Revises: 600cf3fb1a7f
+Create Date: 2026-10-18 10:12:41.284913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e41c9a05'
+down_revision: Union[str, None] = '600cf3fb1a7f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_posts_published_publish', 'posts', ['published', 'publish', 'id'], unique=False)
+    op.create_index('ix_posts_title', 'posts', ['title'], unique=False)
+    op.create_index('ix_comments_post_id_active', 'comments', ['post_id', 'active', 'created'], unique=False)
+    op.create_index('ix_store_title', 'store', ['title'], unique=False)
+    op.create_index('ix_users_username', 'users', ['username'], unique=False)
+    op.create_index('ix_users_email', 'users', ['email'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_index('ix_users_username', table_name='users')
+    op.drop_index('ix_store_title', table_name='store')
+    op.drop_index('ix_comments_post_id_active', table_name='comments')
+    op.drop_index('ix_posts_title', table_name='posts')
+    op.drop_index('ix_posts_published_publish', table_name='posts')
@@ -0,0 +1,43 @@
+"""Add comment body hash for duplicate detection
+
+Revision ID: b8d4f0a2c6e3
+Revises: a5c1e7b3d9f2
+Create Date: 2026-10-18 14:26:53.871402
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d4f0a2c6e3'
+down_revision: Union[str, None] = 'a5c1e7b3d9f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('comments', sa.Column('body_hash', sa.String(length=64), nullable=True))
+
+    # Хеши существующих комментариев (как body_hash в backend/comment_queue.py);
+    # у повторов текста под тем же постом хеш остается NULL, иначе уникальный индекс не создастся
+    conn = op.get_bind()
+    seen = set()
+    updates = []
+    for comment_id, post_id, body in conn.execute(sa.text('SELECT id, post_id, body FROM comments ORDER BY id')):
+        key = hashlib.sha256(' '.join((body or '').split()).lower().encode('utf-8')).hexdigest()
+        if (post_id, key) not in seen:
+            seen.add((post_id, key))
+            updates.append({'id': comment_id, 'body_hash': key})
+    if updates:
+        conn.execute(sa.text('UPDATE comments SET body_hash = :body_hash WHERE id = :id'), updates)
+
+    op.create_index('ix_comments_post_id_body_hash', 'comments', ['post_id', 'body_hash'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_comments_post_id_body_hash', table_name='comments')
+    op.drop_column('comments', 'body_hash')
@@ -0,0 +1,32 @@
+"""Add cart items
+
+Revision ID: c4a8e1f3d2b6
+Revises: b7d2e41c9a05
+Create Date: 2026-10-18 11:03:17.552104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8e1f3d2b6'
+down_revision: Union[str, None] = 'b7d2e41c9a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('cart_items',
+    sa.Column('cart_id', sa.String(length=32), nullable=False),
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['store_id'], ['store.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('cart_id', 'store_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('cart_items')
@@ -0,0 +1,89 @@
+"""Add full-text search
+
+Revision ID: d9e3b5a7c1f4
+Revises: c4a8e1f3d2b6
+Create Date: 2026-10-18 11:41:06.903377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9e3b5a7c1f4'
+down_revision: Union[str, None] = 'c4a8e1f3d2b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# SQLite: FTS5 с внешним содержимым и триггеры синхронизации, PostgreSQL: tsvector + GIN
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, body, tags, content='posts', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, body, tags) VALUES (new.id, new.title, new.body, new.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ad AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, body, tags) VALUES ('delete', old.id, old.title, old.body, old.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_au AFTER UPDATE OF title, body, tags ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, body, tags) VALUES ('delete', old.id, old.title, old.body, old.tags);
+        INSERT INTO posts_fts(rowid, title, body, tags) VALUES (new.id, new.title, new.body, new.tags);
+    END""",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS store_fts USING fts5(title, description, content='store', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_ai AFTER INSERT ON store BEGIN
+        INSERT INTO store_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_ad AFTER DELETE ON store BEGIN
+        INSERT INTO store_fts(store_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_au AFTER UPDATE OF title, description ON store BEGIN
+        INSERT INTO store_fts(store_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO store_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    "INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')",
+    "INSERT INTO store_fts(store_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS posts_fts_ai",
+    "DROP TRIGGER IF EXISTS posts_fts_ad",
+    "DROP TRIGGER IF EXISTS posts_fts_au",
+    "DROP TRIGGER IF EXISTS store_fts_ai",
+    "DROP TRIGGER IF EXISTS store_fts_ad",
+    "DROP TRIGGER IF EXISTS store_fts_au",
+    "DROP TABLE IF EXISTS posts_fts",
+    "DROP TABLE IF EXISTS store_fts",
+]
+
+POSTGRESQL_CREATE = [
+    """ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(tags, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(body, '')), 'C')) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_posts_search_vector ON posts USING gin (search_vector)",
+    """ALTER TABLE store ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'C')) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_store_search_vector ON store USING gin (search_vector)",
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS ix_store_search_vector",
+    "ALTER TABLE store DROP COLUMN IF EXISTS search_vector",
+    "DROP INDEX IF EXISTS ix_posts_search_vector",
+    "ALTER TABLE posts DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for statement in {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRESQL_CREATE}.get(dialect, []):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for statement in {'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}.get(dialect, []):
+        op.execute(statement)
@@ -0,0 +1,66 @@
+"""Add normalized post tags
+
+Revision ID: e2f6c8a4b0d7
+Revises: d9e3b5a7c1f4
+Create Date: 2026-10-18 12:20:54.118930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f6c8a4b0d7'
+down_revision: Union[str, None] = 'd9e3b5a7c1f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('tags',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('post_tags',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id', 'tag_id')
+    )
+    op.create_index('ix_post_tags_tag_id_post_id', 'post_tags', ['tag_id', 'post_id'], unique=False)
+
+    # Перенос тегов из строки posts.tags ("космос, марс") в новые таблицы
+    conn = op.get_bind()
+    posts = conn.execute(sa.text("SELECT id, tags FROM posts WHERE tags IS NOT NULL AND tags != ''")).all()
+    post_tags = {}
+    for post_id, tags in posts:
+        names = []
+        for name in tags.split(','):
+            name = name.strip().lower()[:64]
+            if name and name not in names:
+                names.append(name)
+        post_tags[post_id] = names
+
+    all_names = sorted({name for names in post_tags.values() for name in names})
+    if not all_names:
+        return
+    tags_table = sa.table('tags', sa.column('id', sa.Integer), sa.column('name', sa.String))
+    op.bulk_insert(tags_table, [{'name': name} for name in all_names])
+    tag_ids = dict(conn.execute(sa.text('SELECT name, id FROM tags')).all())
+
+    post_tags_table = sa.table('post_tags', sa.column('post_id', sa.Integer), sa.column('tag_id', sa.Integer))
+    op.bulk_insert(post_tags_table, [
+        {'post_id': post_id, 'tag_id': tag_ids[name]}
+        for post_id, names in post_tags.items() for name in names
+    ])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_post_tags_tag_id_post_id', table_name='post_tags')
+    op.drop_table('post_tags')
+    op.drop_table('tags')
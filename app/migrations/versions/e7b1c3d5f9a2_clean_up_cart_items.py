@@ -0,0 +1,28 @@
+"""Clean up cart items of deleted products
+
+Revision ID: e7b1c3d5f9a2
+Revises: c2e6a8f4b1d5
+Create Date: 2026-10-18 17:10:42.318205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b1c3d5f9a2'
+down_revision: Union[str, None] = 'c2e6a8f4b1d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # строки корзин удаленных товаров: ON DELETE CASCADE в SQLite не срабатывал (внешние ключи не проверяются)
+    op.execute('DELETE FROM cart_items WHERE store_id NOT IN (SELECT id FROM store)')
+    op.create_index('ix_cart_items_store_id', 'cart_items', ['store_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_cart_items_store_id', table_name='cart_items')
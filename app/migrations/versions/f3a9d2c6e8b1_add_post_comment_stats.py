@@ -0,0 +1,42 @@
+"""Add denormalized comment stats to posts
+
+Revision ID: f3a9d2c6e8b1
+Revises: e2f6c8a4b0d7
+Create Date: 2026-10-18 13:05:41.527310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d2c6e8b1'
+down_revision: Union[str, None] = 'e2f6c8a4b0d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('posts', sa.Column('last_comment_at', sa.DateTime(), nullable=True))
+
+    # Заполнение счетчиков по существующим активным комментариям
+    op.execute(
+        "UPDATE posts SET "
+        "comment_count = (SELECT count(*) FROM comments "
+        "WHERE comments.post_id = posts.id AND comments.active), "
+        "last_comment_at = (SELECT max(comments.created) FROM comments "
+        "WHERE comments.post_id = posts.id AND comments.active)"
+    )
+
+    op.create_index('ix_posts_published_comment_count', 'posts', ['published', 'comment_count', 'id'], unique=False)
+    op.create_index('ix_posts_published_last_comment_at', 'posts', ['published', 'last_comment_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_published_last_comment_at', table_name='posts')
+    op.drop_index('ix_posts_published_comment_count', table_name='posts')
+    op.drop_column('posts', 'last_comment_at')
+    op.drop_column('posts', 'comment_count')
@@ -0,0 +1,27 @@
+"""Add store deleted_at
+
+Revision ID: f5d9b2e8a4c7
+Revises: e7b1c3d5f9a2
+Create Date: 2026-10-18 17:42:09.615370
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5d9b2e8a4c7'
+down_revision: Union[str, None] = 'e7b1c3d5f9a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # товары снимаются с продажи, а не удаляются: на них ссылаются order_lines и user_store
+    op.add_column('store', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('store', 'deleted_at')
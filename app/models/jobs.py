@@ -0,0 +1,31 @@
+import sys
+import os
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.db import Base
+
+
+# Фоновая задача (отправка письма и другие медленные действия), выполняется воркерами backend/jobs.py
+class Job(Base):
+    __tablename__ = 'jobs'
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(64), nullable=False)  # имя обработчика, например 'send_email'
+    payload = Column(Text, nullable=False)  # аргументы обработчика в JSON
+    status = Column(String(16), nullable=False, default='pending')  # pending, running, done, dead
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime, nullable=False)  # не раньше этого времени (повтор с задержкой)
+    locked_at = Column(DateTime, nullable=True)  # когда воркер взял задачу
+    last_error = Column(Text, nullable=True)
+    created = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    finished = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # выбор следующей задачи воркером: статус и время запуска
+        Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    def __str__(self):
+        return f'Job {self.id} {self.kind} ({self.status})'
@@ -1,7 +1,7 @@
 from datetime import datetime, timezone
 import sys
 import os
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Boolean, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Boolean, Text
 from sqlalchemy.orm import relationship
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -19,12 +19,53 @@ class Post(Base):
     image = Column(String, nullable=True)  
     published = Column(Boolean, default=False)  # Флаг, указывающий, опубликована ли задача
     tags = Column(String, nullable=True)  # Теги задачи (можно хранить как строку, разделенную запятыми)
-    comments = relationship("Comment", back_populates="post")
+    # денормализованные счетчики активных комментариев, обновляются вместе с комментариями (backend/comment_stats.py)
+    comment_count = Column(Integer, nullable=False, default=0, server_default='0')
+    last_comment_at = Column(DateTime, nullable=True)
+    # Политика загрузки связей: lazy="raise_on_sql" - неявная ленивая загрузка запрещена
+    # (в AsyncSession она все равно падает, а в цикле шаблона дает N+1 запросов).
+    # Связи загружаются явно в месте запроса: options(selectinload(Post.comments)) и т.п.
+    comments = relationship("Comment", back_populates="post", lazy="raise_on_sql")
+    # нормализованные теги (таблицы tags и post_tags), строка tags остается для отображения и поиска
+    tag_list = relationship("Tag", secondary="post_tags", back_populates="posts", lazy="raise_on_sql")
+
+    __table_args__ = (
+        # список опубликованных постов: фильтр по published и сортировка по дате публикации
+        Index('ix_posts_published_publish', 'published', 'publish', 'id'),
+        # списки "самые обсуждаемые" и "недавно обсуждаемые"
+        Index('ix_posts_published_comment_count', 'published', 'comment_count', 'id'),
+        Index('ix_posts_published_last_comment_at', 'published', 'last_comment_at', 'id'),
+        # проверка на дубликат при создании поста в админке
+        Index('ix_posts_title', 'title'),
+    )
 
     def __str__(self):
         return self.title
 
 
+class Tag(Base):
+    __tablename__ = 'tags'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(64), nullable=False, unique=True)  # уникальный индекс для поиска тега по имени
+    posts = relationship("Post", secondary="post_tags", back_populates="tag_list", lazy="raise_on_sql")
+
+    def __str__(self):
+        return self.name
+
+
+class PostTag(Base):
+    __tablename__ = 'post_tags'
+
+    post_id = Column(Integer, ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True)
+    tag_id = Column(Integer, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True)
+
+    __table_args__ = (
+        # посты по тегу (поиск похожих постов), первичный ключ покрывает теги поста
+        Index('ix_post_tags_tag_id_post_id', 'tag_id', 'post_id'),
+    )
+
+
 class Comment(Base):
     __tablename__ = 'comments' 
 
@@ -33,16 +74,24 @@ class Comment(Base):
     name = Column(String(80), nullable=False)  
     email = Column(String, nullable=False)  
     body = Column(Text, nullable=False)
-    created = Column(DateTime, default=datetime.now(timezone.utc))  # Дата и время создания комментарияupdated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created = Column(DateTime, default=lambda: datetime.now(timezone.utc))  # Дата и время создания комментарияupdated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     active = Column(Boolean, default=True)
+    body_hash = Column(String(64), nullable=True)  # sha256 нормализованного текста для поиска дубликатов (backend/comment_queue.py)
     # Определение связи с моделью Post
-    post = relationship('Post', back_populates='comments')
+    post = relationship('Post', back_populates='comments', lazy='raise_on_sql')
+
+    __table_args__ = (
+        # активные комментарии поста в порядке создания
+        Index('ix_comments_post_id_active', 'post_id', 'active', 'created'),
+        # один и тот же текст под постом сохраняется один раз (NULL - у старых дубликатов)
+        Index('ix_comments_post_id_body_hash', 'post_id', 'body_hash', unique=True),
+    )
 
     class Meta:
         ordering = ('created', )
 
     def __str__(self):
-        return f'Comment by {self.name} on {self.post}'
+        return f'Comment by {self.name} on post {self.post_id}'
 
 
 
@@ -1,13 +1,11 @@
 import sys
 import os
-from sqlalchemy import Column, Date, Integer, String, ForeignKey
+from sqlalchemy import Column, Date, Index, Integer, String, ForeignKey
 from sqlalchemy.orm import relationship
-from passlib.context import CryptContext
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from backend.db import Base
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from backend import passwords
 
 class User(Base):
     __tablename__ = 'users' #указывает имя таблицы в базе данных, которая будет соответствовать этому классу
@@ -20,19 +18,27 @@ class User(Base):
     email = Column(String)
     birthday = Column(String)
     password = Column(String) 
-    goods =  relationship("Store", secondary="user_store", back_populates="buyers")
+    goods =  relationship("Store", secondary="user_store", back_populates="buyers", lazy="raise_on_sql")
     # relationship устанавливает связь между моделью store и моделью User . Это позволяет SQLAlchemy автоматически загружать связанные объекты.
     # back_populates="users" указывает, что в модели User  также будет связь, которая ссылается на store. 
+    # lazy="raise_on_sql" запрещает неявную загрузку: нужные связи подгружаются через selectinload в запросе
+
+    __table_args__ = (
+        # проверка существования пользователя при регистрации и в админке
+        Index('ix_users_username', 'username'),
+        Index('ix_users_email', 'email'),
+    )
     
     def __str__(self):
         return self.username
     
-    # функции хеширования пароля
-    def set_password(self, password: str):
-        self.password = pwd_context.hash(password)
+    # функции хеширования пароля: bcrypt выполняется в пуле потоков (backend.passwords), а не в цикле событий
+    async def set_password(self, password: str):
+        self.password = await passwords.hash_password(password)
 
-    def verify_password(self, password: str):
-        return pwd_context.verify(password, self.password)
+    # при успешной проверке устаревший хеш заменяется новым и сохраняется в базе
+    async def verify_password(self, db, password: str) -> bool:
+        return await passwords.check_user_password(db, self, password)
 
 
 '''# проверка создания таблицы, можно использовать при необходимости
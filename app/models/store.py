@@ -1,6 +1,7 @@
 import sys
 import os
-from sqlalchemy import Column, Float, Integer, String, Boolean, ForeignKey, Text
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, Boolean, ForeignKey, Text
 from sqlalchemy.orm import relationship
 
 
@@ -19,7 +20,14 @@ class Store(Base):
     cost = Column(Integer)
     photo = Column(String)
     uploaded_at = Column(Boolean, default=False) #По умолчанию значение False
-    buyers = relationship("User", secondary="user_store", back_populates="goods")
+    stock = Column(Integer, nullable=False, default=0, server_default='0')  # остаток на складе, уменьшается при оформлении заказа
+    deleted_at = Column(DateTime, nullable=True)  # товар снят с продажи: строка остается для заказов (order_lines, user_store)
+    buyers = relationship("User", secondary="user_store", back_populates="goods", lazy="raise_on_sql")  # загружать через selectinload
+
+    __table_args__ = (
+        # поиск товара по названию (проверка на дубликат в админке)
+        Index('ix_store_title', 'title'),
+    )
     
     def __str__(self):
         return self.title
@@ -30,6 +38,43 @@ class UserStore(Base):
     user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
     store_id = Column(Integer, ForeignKey('store.id'), primary_key=True)
 
+
+# Строка корзины покупателя: корзина хранится на сервере, в cookie сессии лежит только cart_id
+class CartItem(Base):
+    __tablename__ = 'cart_items'
+    cart_id = Column(String(32), primary_key=True)
+    store_id = Column(Integer, ForeignKey('store.id', ondelete='CASCADE'), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        # удаление товара из всех корзин (forget_product)
+        Index('ix_cart_items_store_id', 'store_id'),
+    )
+
+# Заказ: создается при оформлении корзины, остаток товаров списывается в той же транзакции (backend/orders.py)
+class Order(Base):
+    __tablename__ = 'orders'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)  # покупатель без регистрации - NULL
+    status = Column(String(20), nullable=False, default='new')
+    total_cost = Column(Integer, nullable=False)
+    created = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    lines = relationship("OrderLine", lazy="raise_on_sql")  # загружать через selectinload
+
+    __table_args__ = (
+        # заказы покупателя, сначала новые
+        Index('ix_orders_user_id_created', 'user_id', 'created'),
+    )
+
+
+# Строка заказа: количество и цена товара на момент покупки
+class OrderLine(Base):
+    __tablename__ = 'order_lines'
+    order_id = Column(Integer, ForeignKey('orders.id', ondelete='CASCADE'), primary_key=True)
+    store_id = Column(Integer, ForeignKey('store.id'), primary_key=True)
+    quantity = Column(Integer, nullable=False)
+    price = Column(Integer, nullable=False)
+
 '''# проверка создания таблицы, можно использовать при необходимости
 from sqlalchemy.schema import CreateTable
 print(CreateTable(Store.__table__))'''
\ No newline at end of file
@@ -1,30 +1,38 @@
+import io
 import os
 import sys
-from fastapi import APIRouter, Depends, Form, HTTPException, Path, Request, status
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Path, Request, UploadFile, status
 # Сессия БД
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from passlib.context import CryptContext
 
 # Аннотации, Модели БД и Pydantic.
-from typing import Annotated, List
+from datetime import datetime, timezone
+from typing import Annotated, List, Optional
 
 # Функции работы с записями.
 from sqlalchemy import insert, select, update, delete
+from sqlalchemy.orm import selectinload
 from slugify import slugify
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from backend.cache import page_cache
+from backend.cart import cart_store
+from backend.comment_stats import refresh_comment_stats
 from backend.db_depends import get_db
+from backend.images import save_image
+from backend.pagination import count_cache
+from backend.passwords import hash_password
+from backend.product_cache import product_cache
+from backend.store_import import detect_format, import_stream
+from backend.tags import set_post_tags
+from backend.templates import templates
 from models.sign_in import User
 from models.posts import Post, Comment
 from models.store import Store
 from schemas.schemas import *
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-templates = Jinja2Templates(directory="app/templates")
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -32,7 +40,7 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 # Функции для отображения админки
 @router.get("/", response_class=HTMLResponse, name="admin")
 async def admin_panel(request: Request):
-    return templates.TemplateResponse("admin/admin.html", {"request": request})
+    return await templates.render("admin/admin.html", {"request": request})
 
 
 """------------------------------------------------------------------------------------- АДМИНКА ДЛЯ ПОЛЬЗОВАТЕЛЕЙ ------------------------------------------------------------------------------"""
@@ -43,14 +51,14 @@ async def admin_panel(request: Request):
 async def get_users(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
     result = await db.execute(select(User))
     users = result.all()
-    return templates.TemplateResponse(
+    return await templates.render(
         "admin/users.html", {"request": request, "users": users}
     )
 
 # для отображения формы для нового пользователя
 @router.get("/user_form", response_model=List[UserResponse])
 async def user_form(request: Request):
-    return templates.TemplateResponse("admin/users.html", {"request": request})
+    return await templates.render("admin/users.html", {"request": request})
 
 # для создания нового пользователя
 @router.post("/create_user", response_class=HTMLResponse)
@@ -71,13 +79,12 @@ async def create_user(
         )
     '''ИЗМЕНЕН СПОСОБ ДОБАВЛЕНИЯ ПОЛЬЗОВАТЕЛЯ. ЕСЛИ ЗАРАБОТАЕТ, ОСТАЛЬНОЕ ТОЖЕ ПЕРЕДЕЛАТЬ'''
     # Создание нового пользователя
-    hashed_password = pwd_context.hash(password)
+    hashed_password = await hash_password(password)  # хеширование в пуле потоков
     new_user = User(username=username,
         email=email,
-        birthdate=birthdate,
+        birthday=birthdate,
         password=hashed_password,
-        slug=slugify(username),
-    )  # Генерация slug
+    )  # у User нет полей birthdate и slug: дата хранится в birthday
 
     try:
         db.add(new_user)  
@@ -86,7 +93,7 @@ async def create_user(
         await db.rollback()  # В случае ошибки откатываем изменения
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error occurred while creating user") from e
 
-    return templates.TemplateResponse("admin/users.html", {"request": request, "new_user": new_user})
+    return await templates.render("admin/users.html", {"request": request, "new_user": new_user})
 
 
 @router.put("/update_user/{user_id}", response_model=UserResponse)
@@ -110,18 +117,17 @@ async def update_user(
         raise HTTPException(status_code=404, detail="User  not found")
 
     # Создание нового пользователя
-    hashed_password = pwd_context.hash(password)
+    hashed_password = await hash_password(password)
     update_user = {
         "username": username,
         "email": email,
-        "birthdate": birthdate_obj,
+        "birthday": birthdate_obj.isoformat(),
         "password": hashed_password,
-        "slug": slugify(username),
-    }  # Генерация slug
+    }  # ключи - колонки User (дата рождения хранится строкой в birthday)
 
-    db.execute(update(User).values(update_user))
+    await db.execute(update(User).where(User.id == user_id).values(update_user))
     await db.commit()
-    return templates.TemplateResponse("admin/users.html", {"request": request, "update_user": update_user})
+    return await templates.render("admin/users.html", {"request": request, "update_user": update_user})
 
 
 @router.delete("/delete_user/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -133,9 +139,9 @@ async def delete_user(
     user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="User  not found")
-    db.delete(user)
+    await db.delete(user)
     await db.commit()
-    return templates.TemplateResponse("admin/users.html", {"request": request, "user": user})
+    return await templates.render("admin/users.html", {"request": request, "user": user})
 
 
 """------------------------------------------------------------------------------------- АДМИНКА ДЛЯ ТОВАРОВ ------------------------------------------------------------------------------"""
@@ -144,15 +150,16 @@ async def delete_user(
 # Функции для управления товарами
 @router.get("/store_all", response_model=List[StoreResponse])
 async def get_stores(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
-    result = await db.execute(select(Store))
+    # покупатели выводятся в таблице, загружаем их одним дополнительным запросом (selectinload)
+    result = await db.scalars(select(Store).where(Store.deleted_at.is_(None)).options(selectinload(Store.buyers)))
     store = result.all()
-    return templates.TemplateResponse("admin/store.html", {"request": request, "store": store})
+    return await templates.render("admin/store.html", {"request": request, "store": store})
 
 
 # для отображения формы для нового продукта
 @router.get("/store_form", response_model=List[StoreResponse])
 async def store_form(request: Request):
-    return templates.TemplateResponse("admin/store.html", {"request": request})
+    return await templates.render("admin/store.html", {"request": request})
 
 
 # для создания нового продукта
@@ -163,17 +170,23 @@ async def create_store(
     size: Annotated[float, Form(description="размер")],
     description: Annotated[str, Form(description="описание")],
     cost: Annotated[int, Form(description="Стоимость")],
-    photo: Annotated[str, Form(description="фото товара")],
     db: Annotated[AsyncSession, Depends(get_db)],
+    photo: Annotated[str, Form(description="фото товара (URL)")] = "",
+    photo_file: Annotated[Optional[UploadFile], File(description="файл фото товара")] = None,
+    stock: Annotated[int, Form(ge=0, description="остаток на складе")] = 0,
 ):
 
     # Проверка на существование товара с таким же именем
-    existing_product = await db.scalar(select(Store).where(Store.title == title))
+    existing_product = await db.scalar(select(Store).where(Store.title == title, Store.deleted_at.is_(None)))
     if existing_product:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Product already exists"
         )
 
+    # загруженный файл сохраняется по хешу, миниатюры создаются в фоне
+    if photo_file is not None and photo_file.filename:
+        photo = await save_image(photo_file, "store")
+
     # Создание нового пользователя
     new_product = Store(
         title=title,
@@ -181,7 +194,7 @@ async def create_store(
         description=description,
         cost=cost,
         photo=photo,
-        slug=slugify(title))  # Генерация slug
+        stock=stock)
 
     try:
         db.add(new_product)  
@@ -189,8 +202,30 @@ async def create_store(
     except Exception as e:
         await db.rollback()  # В случае ошибки откатываем изменения
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error occurred while creating user") from e
+    # количество товаров изменилось, сбрасываем кэш пагинации, страниц магазина и товаров
+    count_cache.invalidate("store")
+    await page_cache.invalidate("store")
+    product_cache.invalidate(new_product.id)
+
+    return await templates.render("admin/store.html", {"request": request, "new_product": new_product})
 
-    return templates.TemplateResponse("admin/store.html", {"request": request, "new_product": new_product})
+
+# массовый импорт товаров из CSV/NDJSON, возвращает отчет о загрузке
+@router.post("/store_import")
+async def import_store(
+    file: Annotated[UploadFile, File(description="CSV или NDJSON с колонками title, size, description, cost, photo")],
+):
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        report = await import_stream(stream, detect_format(file.filename or ""))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+
+    if report["inserted"]:
+        count_cache.invalidate("store")
+        await page_cache.invalidate("store")
+        product_cache.invalidate()
+    return report
 
 
 @router.put("/store_update/{store_id}", response_model=StoreResponse)
@@ -201,45 +236,59 @@ async def store_apdate(
     size: Annotated[float, Form(description="размер")],
     description: Annotated[str, Form(description="описание")],
     cost: Annotated[int, Form(description="Стоимость")],
-    photo: Annotated[str, Form(description="фото товара")],
     db: Annotated[AsyncSession, Depends(get_db)],
+    photo: Annotated[str, Form(description="фото товара (URL)")] = "",
+    photo_file: Annotated[Optional[UploadFile], File(description="файл фото товара")] = None,
+    stock: Annotated[Optional[int], Form(ge=0, description="новый остаток на складе")] = None,
 ):
 
-    store1 = select(Store).where(Store.id == store_id)
+    store1 = select(Store).where(Store.id == store_id, Store.deleted_at.is_(None))
     result = await db.execute(store1)
     store = result.scalar_one_or_none()
     if not store:
         raise HTTPException(status_code=404, detail="Store not found")
 
+    if photo_file is not None and photo_file.filename:
+        photo = await save_image(photo_file, "store")
+
     # Создание нового пользователя
     update_product = {
         "title": title,
         "size": size,
         "description": description,
         "cost": cost,
-        "photo": photo,
-        "slug": slugify(title),
-    }  # Генерация slug
+        "photo": photo or store.photo,  # без нового фото остается прежнее
+    }
+    if stock is not None:  # без нового значения остаток не меняется (его списывают заказы)
+        update_product["stock"] = stock
 
-    db.execute(update(Store).values(update_product))
+    await db.execute(update(Store).where(Store.id == store_id).values(update_product))
     await db.commit()
+    await page_cache.invalidate("store")
+    product_cache.invalidate(store_id)
 
-    return templates.TemplateResponse("admin/store.html", {"request": request, "update_product": update_product})
+    return await templates.render("admin/store.html", {"request": request, "update_product": update_product})
 
 
 @router.delete("/store_delete/{store_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def store_delete(
     request: Request, store_id: int, db: Annotated[AsyncSession, Depends(get_db)]
 ):
-    store1 = select(Store).where(Store.id == store_id)
-    result = await db.execute(store1)
-    store = result.scalar_one_or_none()
-
-    if not store:
+    # товар снимается с продажи, а не удаляется: на него ссылаются строки заказов и покупки (order_lines, user_store)
+    result = await db.execute(
+        update(Store)
+        .where(Store.id == store_id, Store.deleted_at.is_(None))
+        .values(deleted_at=datetime.now(timezone.utc), stock=0)
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
         raise HTTPException(status_code=404, detail="Store not found")
-    await db.delete(store)
+    await cart_store.forget_product(db, store_id)
     await db.commit()
-    return templates.TemplateResponse("admin/store.html", {"request": request, "store": store})
+    count_cache.invalidate("store")
+    await page_cache.invalidate("store")
+    product_cache.invalidate(store_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 """------------------------------------------------------------------------------------- АДМИНКА ДЛЯ ПОСТОВ -----------------------------------------------------------------------------------"""
@@ -250,7 +299,7 @@ async def store_delete(
 async def get_posts(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
     result = await db.execute(select(Post))
     posts = result.all()
-    return templates.TemplateResponse(
+    return await templates.render(
         "admin/posts.html", {"request": request, "posts": posts}
     )
 
@@ -258,7 +307,7 @@ async def get_posts(request: Request, db: Annotated[AsyncSession, Depends(get_db
 # для отображения формы для нового поста
 @router.get("/posts_form", response_model=List[PostResponse])
 async def post_form(request: Request):
-    return templates.TemplateResponse("admin/posts.html", {"request": request})
+    return await templates.render("admin/posts.html", {"request": request})
 
 
 # для создания нового поста
@@ -269,8 +318,10 @@ async def create_post(
     slug: Annotated[float, Form(description="слаг")],
     body: Annotated[str, Form(description="текст")],
     status: Annotated[int, Form(description="статус")],
-    image: Annotated[str, Form(description="изображение")],
     db: Annotated[AsyncSession, Depends(get_db)],
+    tags: Annotated[Optional[str], Form(description="теги через запятую")] = None,
+    image: Annotated[str, Form(description="изображение (URL)")] = "",
+    image_file: Annotated[Optional[UploadFile], File(description="файл изображения")] = None,
 ):
 
     # Проверка на существование поста с таким же именем
@@ -278,6 +329,9 @@ async def create_post(
     if existing_post:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Post already exists")
 
+    if image_file is not None and image_file.filename:
+        image = await save_image(image_file, "posts")
+
     # Создание нового поста
     new_post = {
         "title": title,
@@ -285,13 +339,17 @@ async def create_post(
         "body": body,
         "status": status,
         "image": image,
+        "tags": tags,
         "slug": slugify(title),
     }  # Генерация slug
 
-    db.execute(insert(Post).values(new_post))
+    post_id = await db.scalar(insert(Post).values(new_post).returning(Post.id))
+    await set_post_tags(db, post_id, tags)  # нормализованные теги для поиска похожих постов
     await db.commit()
+    count_cache.invalidate("posts")
+    await page_cache.invalidate("posts")
 
-    return templates.TemplateResponse("admin/posts.html", {"request": request, "new_post": new_post})
+    return await templates.render("admin/posts.html", {"request": request, "new_post": new_post})
 
 
 @router.put("/update_post/{post_id}", response_model=PostResponse)
@@ -302,8 +360,10 @@ async def update_post(
     slug: Annotated[float, Form(description="слаг")],
     body: Annotated[str, Form(description="текст")],
     status: Annotated[int, Form(description="статус")],
-    image: Annotated[str, Form(description="изображение")],
     db: Annotated[AsyncSession, Depends(get_db)],
+    tags: Annotated[Optional[str], Form(description="теги через запятую")] = None,
+    image: Annotated[str, Form(description="изображение (URL)")] = "",
+    image_file: Annotated[Optional[UploadFile], File(description="файл изображения")] = None,
 ):
 
     post1 = select(Post).where(Post.id == post_id)
@@ -312,20 +372,26 @@ async def update_post(
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
+    if image_file is not None and image_file.filename:
+        image = await save_image(image_file, "posts")
+
     # Создание нового поста
     update_post = {
         "title": title,
         "slug": slug,
         "body": body,
         "status": status,
-        "image": image,
+        "image": image or post.image,  # без нового изображения остается прежнее
+        "tags": tags,
         "slug": slugify(title),
     }  # Генерация slug
 
-    db.execute(update(Post).values(update_post))
+    await db.execute(update(Post).where(Post.id == post_id).values(update_post))
+    await set_post_tags(db, post_id, tags)
     await db.commit()
+    await page_cache.invalidate("posts")
 
-    return templates.TemplateResponse("admin/posts.html", {"request": request, "update_post": update_post})
+    return await templates.render("admin/posts.html", {"request": request, "update_post": update_post})
 
 
 @router.delete("/delete_post/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -337,9 +403,13 @@ async def delete_post(
     post = result.scalar_one_or_none()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    db.delete(post)
+    # комментарии удаляются одним запросом, без загрузки коллекции post.comments
+    await db.execute(delete(Comment).where(Comment.post_id == post_id))
+    await db.delete(post)
     await db.commit()
-    return templates.TemplateResponse("admin/posts.html", {"request": request, "post": post})
+    count_cache.invalidate("posts")
+    await page_cache.invalidate("posts")
+    return await templates.render("admin/posts.html", {"request": request, "post": post})
 
 
 """------------------------------------------------------------------------------------- АДМИНКА ДЛЯ КОМЕНТАРИЕВ -----------------------------------------------------------------------------------"""
@@ -350,7 +420,7 @@ async def delete_post(
 async def get_comments(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
     result = await db.execute(select(Comment))
     comments = result.all()
-    return templates.TemplateResponse("admin/comments.html", {"request": request, "comments": comments})
+    return await templates.render("admin/comments.html", {"request": request, "comments": comments})
 
 
 @router.delete("/all_comments/{comment_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -362,6 +432,30 @@ async def delete_comment(
     comment = result.scalar_one_or_none()
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
-    db.delete(comment)
+    await db.delete(comment)
+    # счетчики поста пересчитываются в той же транзакции
+    await refresh_comment_stats(db, comment.post_id)
     await db.commit()
-    return templates.TemplateResponse("admin/comments.html", {"request": request, "comment": comment})
+    count_cache.invalidate("posts")
+    await page_cache.invalidate("posts")
+    return await templates.render("admin/comments.html", {"request": request, "comment": comment})
+
+
+# скрытие (active=false) или возврат комментария, счетчики поста пересчитываются в той же транзакции
+@router.put("/all_comments/{comment_id}/active", response_class=HTMLResponse)
+async def set_comment_active(
+    request: Request,
+    comment_id: int,
+    active: Annotated[bool, Form(description="показывать комментарий")],
+    db: Annotated[AsyncSession, Depends(get_db)],
+):
+    comment = await db.scalar(select(Comment).where(Comment.id == comment_id))
+    if not comment:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    if comment.active != active:
+        comment.active = active
+        await refresh_comment_stats(db, comment.post_id)
+        await db.commit()
+        count_cache.invalidate("posts")
+        await page_cache.invalidate("posts")
+    return await templates.render("admin/comments.html", {"request": request, "comment": comment})
@@ -0,0 +1,204 @@
+'''JSON API для мобильных и SPA-клиентов: каталог, корзина, посты и комментарии (/api/v1).
+HTML-страницы остаются как были, API работает с теми же таблицами, кэшами и очередями:
+- ответ собирается из строк запроса только с нужными колонками (backend/serialization.py),
+  параметр fields сужает и выборку, и ответ: /api/v1/posts?fields=id,title,comment_count;
+- списки - курсорная пагинация (after / before из полей next / prev ответа);
+- условные запросы: у ответов есть ETag, на If-None-Match с тем же значением - 304 без тела.
+  Посты и комментарии дополнительно кэшируются на сервере (тег "posts"); товары не кэшируются,
+  потому что остаток (stock) меняется при каждом заказе;
+- корзина - та же, что у сайта (cookie сессии).'''
+
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Annotated, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from backend import config
+from backend.cache import cache_page, conditional_response
+from backend.cart import cart_lines, cart_store, get_cart_id
+from backend.comment_queue import body_hash, comment_queue, find_duplicate
+from backend.db_depends import get_db
+from backend.pagination import keyset_page
+from backend.product_cache import product_cache
+from backend.serialization import JSON_MEDIA_TYPE, dump_json, json_response, parse_fields, select_columns
+from models.posts import Comment, Post
+from models.store import Store
+from schemas.api import ApiCart, ApiPage, CartLineItem, CommentCreate, CommentItem, PostItem, ProductItem
+from .posts import POST_EXCERPT_LENGTH, POST_SORT_KEYS
+
+
+router = APIRouter(prefix="/api/v1", tags=["api"])
+
+PageSize = Annotated[int, Query(gt=0, le=config.API_MAX_PAGE_SIZE)]
+Fields = Annotated[Optional[str], Query(description="поля ответа через запятую, например id,title")]
+
+# поле ответа -> колонка запроса
+PRODUCT_COLUMNS = {name: getattr(Store, name) for name in ProductItem.model_fields}
+POST_COLUMNS = {
+    'id': Post.id,
+    'title': Post.title,
+    'slug': Post.slug,
+    'publish': Post.publish,
+    'image': Post.image,
+    'tags': Post.tags,
+    'comment_count': Post.comment_count,
+    'last_comment_at': Post.last_comment_at,
+    'excerpt': func.substr(Post.body, 1, POST_EXCERPT_LENGTH).label("excerpt"),
+    'body': Post.body,
+}
+COMMENT_COLUMNS = {name: getattr(Comment, name) for name in CommentItem.model_fields}
+# в списке постов полный текст отдается только по запросу (fields=...,body), в самом посте - без фрагмента
+POST_LIST_FIELDS = tuple(name for name in PostItem.model_fields if name != 'body')
+POST_DETAIL_FIELDS = tuple(name for name in PostItem.model_fields if name != 'excerpt')
+
+
+# каталог товаров, курсорная пагинация по Store.id
+@router.get("/products", name="api:products")
+async def products(request: Request,
+                   db: Annotated[AsyncSession, Depends(get_db)],
+                   size: PageSize = config.API_PAGE_SIZE,
+                   after: Optional[str] = None,
+                   before: Optional[str] = None,
+                   fields: Fields = None):
+    names = parse_fields(ProductItem, fields)
+    query = select(*select_columns(PRODUCT_COLUMNS, names, Store.id)).where(Store.deleted_at.is_(None))
+    rows, next_cursor, prev_cursor = await keyset_page(
+        db, query, [Store.id], size, after=after, before=before, scalars=False)
+    body = dump_json(ProductItem, names, {'items': rows, 'next': next_cursor, 'prev': prev_cursor}, ApiPage)
+    return conditional_response(request, body, JSON_MEDIA_TYPE)
+
+
+@router.get("/products/{product_id}", name="api:product")
+async def product(request: Request,
+                  product_id: int,
+                  db: Annotated[AsyncSession, Depends(get_db)],
+                  fields: Fields = None):
+    names = parse_fields(ProductItem, fields)
+    row = (await db.execute(select(*select_columns(PRODUCT_COLUMNS, names))
+                            .where(Store.id == product_id, Store.deleted_at.is_(None)))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return conditional_response(request, dump_json(ProductItem, names, row), JSON_MEDIA_TYPE)
+
+
+# корзина текущей сессии; товары берутся из кэша товаров
+async def _cart_body(db: AsyncSession, request: Request, fields: Optional[str]) -> bytes:
+    names = parse_fields(CartLineItem, fields)
+    lines, total_cost = await cart_lines(db, get_cart_id(request))
+    items = [{'product_id': product.id, 'title': product.title, 'cost': product.cost, 'quantity': quantity}
+             for product, quantity in lines]
+    return dump_json(CartLineItem, names, {'items': items, 'total_cost': total_cost}, ApiCart)
+
+
+@router.get("/cart", name="api:cart")
+async def cart(request: Request,
+               db: Annotated[AsyncSession, Depends(get_db)],
+               fields: Fields = None):
+    return conditional_response(request, await _cart_body(db, request, fields), JSON_MEDIA_TYPE)
+
+
+# добавление товара в корзину (количество увеличивается, если товар уже в корзине), ответ - корзина
+@router.post("/cart/{product_id}", name="api:cart_add")
+async def cart_add(request: Request,
+                   product_id: Annotated[int, Path(ge=1)],
+                   db: Annotated[AsyncSession, Depends(get_db)],
+                   quantity: Annotated[int, Query(ge=1, le=1000)] = 1,
+                   fields: Fields = None):
+    if not await product_cache.get(db, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    await cart_store.add(db, get_cart_id(request), product_id, quantity)
+    return json_response(await _cart_body(db, request, fields))
+
+
+@router.delete("/cart/{product_id}", name="api:cart_remove")
+async def cart_remove(request: Request,
+                      product_id: int,
+                      db: Annotated[AsyncSession, Depends(get_db)],
+                      fields: Fields = None):
+    await cart_store.remove(db, get_cart_id(request), product_id)
+    return json_response(await _cart_body(db, request, fields))
+
+
+@router.delete("/cart", name="api:cart_clear")
+async def cart_clear(request: Request,
+                     db: Annotated[AsyncSession, Depends(get_db)],
+                     fields: Fields = None):
+    await cart_store.clear(db, get_cart_id(request))
+    return json_response(await _cart_body(db, request, fields))
+
+
+# опубликованные посты; порядок - как у HTML-списка (sort=new|discussed|active)
+@router.get("/posts", name="api:posts")
+@cache_page("posts")
+async def posts(request: Request,
+                db: Annotated[AsyncSession, Depends(get_db)],
+                size: PageSize = config.API_PAGE_SIZE,
+                after: Optional[str] = None,
+                before: Optional[str] = None,
+                sort: Literal['new', 'discussed', 'active'] = 'new',
+                fields: Fields = None):
+    names = parse_fields(PostItem, fields, POST_LIST_FIELDS)
+    sort_key = POST_SORT_KEYS[sort]
+    query = select(*select_columns(POST_COLUMNS, names, *sort_key)).where(Post.published.is_(True))
+    if sort == 'active':
+        query = query.where(Post.last_comment_at.is_not(None))
+    rows, next_cursor, prev_cursor = await keyset_page(
+        db, query, sort_key, size, after=after, before=before, descending=True, scalars=False)
+    return json_response(dump_json(PostItem, names, {'items': rows, 'next': next_cursor, 'prev': prev_cursor}, ApiPage))
+
+
+@router.get("/posts/{post_id}", name="api:post")
+@cache_page("posts")
+async def post(request: Request,
+               post_id: int,
+               db: Annotated[AsyncSession, Depends(get_db)],
+               fields: Fields = None):
+    names = parse_fields(PostItem, fields, POST_DETAIL_FIELDS)
+    row = (await db.execute(
+        select(*select_columns(POST_COLUMNS, names)).where(Post.id == post_id, Post.published.is_(True)))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return json_response(dump_json(PostItem, names, row))
+
+
+# активные комментарии поста, от старых к новым (курсор по created, id)
+@router.get("/posts/{post_id}/comments", name="api:comments")
+@cache_page("posts")
+async def comments(request: Request,
+                   post_id: int,
+                   db: Annotated[AsyncSession, Depends(get_db)],
+                   size: PageSize = config.API_PAGE_SIZE,
+                   after: Optional[str] = None,
+                   before: Optional[str] = None,
+                   fields: Fields = None):
+    names = parse_fields(CommentItem, fields)
+    sort_key = [Comment.created, Comment.id]
+    query = (select(*select_columns(COMMENT_COLUMNS, names, *sort_key))
+             .where(Comment.post_id == post_id, Comment.active.is_(True)))
+    rows, next_cursor, prev_cursor = await keyset_page(
+        db, query, sort_key, size, after=after, before=before, scalars=False)
+    # пустой список - отдельной проверкой отличаем пост без комментариев от несуществующего
+    if not rows and await db.scalar(select(Post.id).where(Post.id == post_id, Post.published.is_(True))) is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return json_response(dump_json(CommentItem, names, {'items': rows, 'next': next_cursor, 'prev': prev_cursor}, ApiPage))
+
+
+# новый комментарий: ставится в очередь записи (backend/comment_queue.py), ответ 202 без ожидания записи
+@router.post("/posts/{post_id}/comments", status_code=status.HTTP_202_ACCEPTED, name="api:comment_create")
+async def comment_create(post_id: int,
+                         comment: CommentCreate,
+                         db: Annotated[AsyncSession, Depends(get_db)]):
+    key = body_hash(comment.body)
+    duplicate = await find_duplicate(db, post_id, key)
+    if duplicate is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if duplicate:
+        raise HTTPException(status_code=409, detail="Comment already exists")
+    await comment_queue.submit({**comment.model_dump(), 'post_id': post_id, 'body_hash': key,
+                                'created': datetime.now(timezone.utc)})
+    return {"status": "accepted"}
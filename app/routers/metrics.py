@@ -0,0 +1,16 @@
+import os
+import sys
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from backend import db_metrics, http_metrics, product_cache
+
+router = APIRouter(tags=["metrics"])
+
+
+# метрики приложения в текстовом формате Prometheus (scrape: GET /metrics): HTTP, SQL и кэш товаров
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(http_metrics.render_prometheus() + db_metrics.render_prometheus() + product_cache.render_prometheus(), media_type="text/plain; version=0.0.4")
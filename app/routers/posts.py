@@ -2,56 +2,117 @@ import os
 import sys
 from fastapi import APIRouter, Depends, Form, Query, Request, HTTPException
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-# Функция для отправки по эмейлу
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 # Сессия БД
 from sqlalchemy.ext.asyncio import AsyncSession
 # Аннотации, Модели БД и Pydantic.
-from typing import Annotated, List
+from datetime import datetime, timezone
+from typing import Annotated, List, Literal
 # Функции работы с записями.
-from sqlalchemy import  insert, select
+from sqlalchemy import extract, func, insert, select
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from backend.cache import cache_page
+from backend.comment_queue import body_hash, comment_queue, find_duplicate
 from backend.db_depends import get_db
+from backend.mail import queue_email
+from backend.pagination import count_cache, keyset_page, row_cursor
+from backend.tags import similar_posts
+from backend.templates import templates
 from models.posts import Post, Comment
 from schemas.schemas import *
 
 
-templates = Jinja2Templates(directory="app/templates")
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
+# длина фрагмента текста поста в списке
+POST_EXCERPT_LENGTH = 300
+
+# порядок списка постов: ключ курсорной пагинации (по убыванию), последней идет уникальная колонка
+POST_SORT_KEYS = {
+    'new': [Post.publish, Post.id],  # сначала новые
+    'discussed': [Post.comment_count, Post.id],  # самые обсуждаемые
+    'active': [Post.last_comment_at, Post.id],  # недавно обсуждаемые, только посты с комментариями
+}
+
 # функция отображает все посты с пагинатором
+# страница выбирается в SQL (LIMIT/OFFSET или курсор after/before по ключу сортировки),
+# для карточек списка загружаются только нужные колонки и короткий фрагмент текста вместо body;
+# сортировка по обсуждаемости идет по денормализованным счетчикам posts.comment_count / last_comment_at
 @router.get("/", response_class=HTMLResponse, name="posts")
+@cache_page("posts")
 async def post_list(request: Request,
                     db: Annotated[AsyncSession, Depends(get_db)],
                     post_slug: Optional[str] = None,
                     items_per_page: int = Query(2, gt=0),  # Минимум 1 элемент на странице
                     page: int = Query(1, gt=0),  # Минимум 1 страница
+                    after: Optional[str] = None,
+                    before: Optional[str] = None,
+                    sort: Literal['new', 'discussed', 'active'] = 'new',
                     ):
     
-    # Получаем все опубликованные посты
-    query = select(Post).where(Post.published.is_(True))
-    
     if post_slug:
-        post = db.scalar(select(Post).where(Post.slug == post_slug))
+        post = await db.scalar(select(Post).where(Post.slug == post_slug))
         if not post:
             raise HTTPException(status_code=404, detail="Post not found")
-        return templates.TemplateResponse("spaceposts/detail.html", {"request": request, "post": post})
-
-    # Получаем общее количество постов
-    result = await db.execute(query)
-    total_posts = result.scalars().all()  # Получаем скалярные результаты
+        return await templates.render("spaceposts/detail.html", {"request": request, "post": post})
+
+    # Колонки для карточки поста, без полного текста
+    query = select(
+        Post.id,
+        Post.title,
+        Post.slug,
+        Post.publish,
+        Post.image,
+        Post.tags,
+        Post.comment_count,
+        Post.last_comment_at,
+        func.substr(Post.body, 1, POST_EXCERPT_LENGTH).label("excerpt"),
+    ).where(Post.published.is_(True))
+    count_query = select(Post.id).where(Post.published.is_(True))
+    count_key = "posts"
+    if sort == 'active':
+        query = query.where(Post.last_comment_at.is_not(None))
+        count_query = count_query.where(Post.last_comment_at.is_not(None))
+        count_key = "posts:active"
+    sort_key = POST_SORT_KEYS[sort]
+
+    # Получаем общее количество опубликованных постов (кэшируется)
+    total_count = await count_cache.get(db, count_key, count_query)
+    total_pages = (total_count + items_per_page - 1) // items_per_page
+
+    if total_count == 0:
+        return await templates.render("posts/list.html", {"request": request})
+
+    if after is not None or before is not None:
+        # Курсорный режим: ключ сортировки по убыванию, например (publish, id)
+        paginated_posts, next_cursor, prev_cursor = await keyset_page(
+            db, query, sort_key, items_per_page,
+            after=after, before=before, descending=True, scalars=False)
+        if not paginated_posts:
+            return await templates.render("posts/list.html", {"request": request})
+        return await templates.render("posts/list.html", {
+            'request': request,
+            'posts': paginated_posts,
+            'items_per_page': items_per_page,
+            'size_param': 'items_per_page',
+            'sort': sort,
+            'total_count': total_count,
+            'total_pages': total_pages,
+            'has_previous': prev_cursor is not None,
+            'has_next': next_cursor is not None,
+            'previous_cursor': prev_cursor,
+            'next_cursor': next_cursor,
+        })
 
     # Пагинация
-    total_count = len(total_posts)
     start = (page - 1) * items_per_page
-    end = start + items_per_page
-    paginated_posts = total_posts[start:end]
+    result = await db.execute(
+        query.order_by(*[column.desc() for column in sort_key]).limit(items_per_page).offset(start))
+    paginated_posts = result.all()
 
-    if total_count == 0 or not paginated_posts:
-        return templates.TemplateResponse("posts/list.html", {"request": request})
+    if not paginated_posts:
+        return await templates.render("posts/list.html", {"request": request})
     
     # Создаем контекст для шаблона
     context = {
@@ -59,15 +120,20 @@ async def post_list(request: Request,
         'posts': paginated_posts,
         'page': page,
         'items_per_page': items_per_page,
+        'sort': sort,
         'total_count': total_count,
-        'total_pages': (total_count + items_per_page - 1) // items_per_page,
+        'total_pages': total_pages,
         'has_previous': page > 1,
         'previous_page_number': page - 1 if page > 1 else None,
-        'has_next': page < (total_count + items_per_page - 1) // items_per_page,
-        'next_page_number': page + 1 if page < (total_count + items_per_page - 1) // items_per_page else None,
+        'has_next': page < total_pages,
+        'next_page_number': page + 1 if page < total_pages else None,
+        # ссылки на соседние страницы - курсорные (как у списка в курсорном режиме)
+        'size_param': 'items_per_page',
+        'previous_cursor': row_cursor(paginated_posts[0], sort_key) if page > 1 else None,
+        'next_cursor': row_cursor(paginated_posts[-1], sort_key) if page < total_pages else None,
     }  
 
-    return templates.TemplateResponse("posts/list.html", context)
+    return await templates.render("posts/list.html", context)
 
 
 
@@ -88,25 +154,26 @@ async def post_detail(
     post_query = select(Post).where(
         Post.slug == post,
         Post.published.is_(True),
-        Post.publish.year == year,
-        Post.publish.month == month,
-        Post.publish.day == day
+        extract('year', Post.publish) == year,
+        extract('month', Post.publish) == month,
+        extract('day', Post.publish) == day
     )
     
-    post_obj = await db.execute(post_query).scalar_one_or_none()
+    post_obj = (await db.execute(post_query)).scalar_one_or_none()
     
     if post_obj is None:
         raise HTTPException(status_code=404, detail="Post not found")
 
     # Получаем активные комментарии
-    result = await db.query(Comment).filter(Comment.post_id == post_obj.id, Comment.active.is_(True))
+    result = await db.scalars(select(Comment).where(Comment.post_id == post_obj.id, Comment.active.is_(True)))
     comments = result.all()
     
     # Обработка формы комментария
     new_comment = None
+    user = request.scope.get('user')  # есть только при подключенном AuthenticationMiddleware
     comment_form = {
-        'name': request.user.username if request.user.is_authenticated else '',
-        'email': request.user.email if request.user.is_authenticated else ''
+        'name': user.username if user and user.is_authenticated else '',
+        'email': user.email if user and user.is_authenticated else ''
     }
 
     # Если запрос POST, обрабатываем новый комментарий
@@ -117,23 +184,13 @@ async def post_detail(
         body = data.get('body')
 
         if name and email and body:  # Простейшая валидация
-            new_comment = Comment(name=name, email=email, body=body, post=post_obj)
-            db.add(new_comment)
-            await db.commit()
-            return templates.TemplateResponse("spaceposts/detail.html", {"request": request, "post": post_obj, "comments": comments, "new_comment": new_comment, "comment_form": comment_form})
-
-    # Получаем похожие посты
-    post_tags_ids = [tag.id for tag in post_obj.tags] if post_obj.tags else []
-    similar_posts_query = (
-        select(Post)
-        .where(Post.published.is_(True))
-        .filter(Post.tags.any(id.in_(post_tags_ids)))
-        .filter(Post.id != post_obj.id)
-        .order_by(Post.publish.desc())
-    )
-    
-    result = await db.execute(similar_posts_query).scalars()
-    similar_posts = result.all()[:4]
+            new_comment = {'post_id': post_obj.id, 'name': name, 'email': email, 'body': body,
+                           'body_hash': body_hash(body), 'created': datetime.now(timezone.utc)}
+            await comment_queue.submit(new_comment)
+            return await templates.render("spaceposts/detail.html", {"request": request, "post": post_obj, "comments": comments, "new_comment": new_comment, "comment_form": comment_form})
+
+    # Получаем похожие посты (по числу общих тегов, ранжирование и LIMIT в SQL)
+    similar = await similar_posts(db, post_obj.id, limit=4)
 
     # Создаем контекст для шаблона
     context = {
@@ -142,10 +199,10 @@ async def post_detail(
         'comments': comments,
         'new_comment': new_comment,
         'comment_form': comment_form,
-        'similar_posts': similar_posts
+        'similar_posts': similar
     }
 
-    return templates.TemplateResponse("posts/detail.html", context)
+    return await templates.render("posts/detail.html", context)
 
 
 
@@ -172,7 +229,7 @@ async def post_detail(
 # для отображения формы для нового поста
 @router.get("/all_comments", response_model=List[PostResponse])
 async def create_comment_form(request: Request):
-    return templates.TemplateResponse("admin/comments.html", {"request": request})
+    return await templates.render("admin/comments.html", {"request": request})
 
 # для создания нового поста
 @router.post("/all_comments", response_class=HTMLResponse)
@@ -180,26 +237,32 @@ async def create_comment(request: Request,
                     post_id: Annotated[int, Form(description="слаг")],
                     name: Annotated[str, Form( description="название")],
                     email: Annotated[str, Form(description="текст")],
-                    body: Annotated[int, Form(description="статус")],
+                    body: Annotated[str, Form(description="статус")],
                     db: Annotated[AsyncSession, Depends(get_db)]):
     
-    # Проверка на существование поста с таким же телом
-    existing_comment = await db.scalar(select(Comment).where(Comment.body == body))
-    if existing_comment:
-        raise HTTPException(status_code=404, detail='Post already exists')
+    # Проверка существования поста и дубликата текста одним запросом (по уникальному индексу post_id, body_hash)
+    key = body_hash(body)
+    duplicate = await find_duplicate(db, post_id, key)
+    if duplicate is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if duplicate:
+        raise HTTPException(status_code=409, detail="Comment already exists")
     
     # Создание нового поста
     new_comment = {
         "post_id": post_id,
         "name": name,
         "email": email,
-        "body": body
+        "body": body,
+        "body_hash": key,
+        "created": datetime.now(timezone.utc),
       }  
     
-    db.execute(insert(Comment).values(new_comment))
-    await db.commit()
+    # запись, модерация и счетчики поста - в фоновом обработчике очереди (backend/comment_queue.py)
+    await comment_queue.submit(new_comment)
     
-    return templates.TemplateResponse("admin/posts.html", {"request": request, "new_comment": new_comment}) 
+    return await templates.render("admin/posts.html", {"request": request, "new_comment": new_comment},
+                                  status_code=202)
 
 # Настройка почтового сервиса
 # тестовый SMTP-сервер, который позволяет отправлять письма без 
@@ -220,42 +283,50 @@ conf = ConnectionConfig(
 )'''
 
 
+# форма для отправки поста по почте
+@router.get("/share/{post_id}", response_class=HTMLResponse, name="post_share_form")
+async def post_share_form(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    post_id: int,
+):
+    post = await db.scalar(select(Post).where(Post.id == post_id, Post.published.is_(True)))
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return await templates.render("posts/share.html", {"request": request, "post": post})
+
+
 #функция для отправки поста
-'''@router.post("/share/{post_id}", response_class=HTMLResponse)
+# письмо ставится в очередь фоновых задач (backend/jobs.py): ответ не ждет SMTP-сервер,
+# при ошибке сервера отправка повторяется
+@router.post("/share/{post_id}", response_class=HTMLResponse, name="post_share")
 async def post_share(
     request: Request,
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_db)],
     post_id: int,
-    form: EmailPostForm,
+    name: Annotated[str, Form(description="имя отправителя")],
+    email: Annotated[str, Form(description="email отправителя")],
+    to: Annotated[str, Form(description="email получателя")],
+    comments: Annotated[str, Form(description="комментарий")] = "",
 ):
     # Получение статьи по id
-    post = db.query(Post).filter(Post.id == post_id, Post.status == 'published').first()
-    
+    post = await db.scalar(select(Post).where(Post.id == post_id, Post.published.is_(True)))
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
+    if "@" not in to or "@" not in email:
+        raise HTTPException(status_code=400, detail="Invalid email")
 
     # Отправка поста
     post_url = request.url_for("post_detail", year=post.publish.year, month=post.publish.month, day=post.publish.day, post=post.slug)
-    subject = f"{form.name} ({form.email}) recommends you reading '{post.title}'"
-    message = f'Read "{post.title}" at {post_url}\n\n{form.name}\'s comments:\n{form.comments}'
-
-    # Отправка почты
-    message = MessageSchema(
-        subject=subject,
-        recipients=[form.to],
-        body=message,
-        subtype="plain"
-    )
-
-    fm = FastMail(conf)
-    await fm.send_message(message)
+    subject = f"{name} ({email}) recommends you reading '{post.title}'"
+    message = f'Read "{post.title}" at {post_url}\n\n{name}\'s comments:\n{comments}'
+    await queue_email(db, [to], subject, message)
 
     # Контекст для шаблона
     context = {
+        'request': request,
         'post': post,
-        'form': form,
         'sent': True
     }
 
-    return templates.TemplateResponse("spaceposts/share.html", context)
-'''
\ No newline at end of file
+    return await templates.render("posts/share.html", context)
@@ -0,0 +1,44 @@
+import os
+import sys
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import HTMLResponse
+# Сессия БД
+from sqlalchemy.ext.asyncio import AsyncSession
+# Аннотации
+from typing import Annotated
+
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from backend.db_depends import get_db
+from backend.search import search_posts, search_products
+from backend.templates import templates
+
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+# функция поиска по постам и товарам с ранжированием и подсветкой совпадений
+# для каждой группы запрашивается size + 1 результат, чтобы узнать, есть ли следующая страница
+@router.get("/", response_class=HTMLResponse, name="search")
+async def search(request: Request,
+                 db: Annotated[AsyncSession, Depends(get_db)],
+                 q: Annotated[str, Query(max_length=200)] = "",
+                 page: int = Query(1, gt=0),
+                 size: int = Query(10, gt=0, le=50)):
+
+    offset = (page - 1) * size
+    posts = await search_posts(db, q, size + 1, offset) if q else []
+    products = await search_products(db, q, size + 1, offset) if q else []
+    has_next = len(posts) > size or len(products) > size
+
+    context = {
+        "request": request,
+        "q": q,
+        "posts": posts[:size],
+        "products": products[:size],
+        "page": page,
+        "size": size,
+        "has_previous": page > 1,
+        "has_next": has_next,
+    }
+    return await templates.render("search/search.html", context)
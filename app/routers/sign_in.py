@@ -5,9 +5,7 @@ from datetime import datetime
 from fastapi import responses
 from fastapi import APIRouter, Depends, Form, Path, Request, status, HTTPException
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.exc import IntegrityError
-from passlib.context import CryptContext
 # Сессия БД
 from sqlalchemy.ext.asyncio import AsyncSession
 # Аннотации, Модели БД и Pydantic.
@@ -18,14 +16,12 @@ from sqlalchemy import insert, select
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from backend.db_depends import get_db
+from backend.passwords import hash_password
+from backend.templates import templates
 from models.sign_in import User
 from schemas.schemas import *
 from schemas.forms import UserCreateForm
 
-# Создаем контекст для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-templates = Jinja2Templates(directory="app/templates")
 
 
 router = APIRouter(prefix="/sign_in", tags=["sign_in"])
@@ -35,7 +31,7 @@ async def create_new_user(user: UserCreateForm, db: AsyncSession):
     new_user = User(
         username=user.username,
         email=user.email,
-        birthdate=user.birthdate,
+        birthday=user.birthdate,
         password=user.password  # Не забудьте захешировать пароль перед сохранением
     )
     
@@ -47,8 +43,8 @@ async def create_new_user(user: UserCreateForm, db: AsyncSession):
 
 # для отображения формы для нового пользователя
 @router.get("/", response_class=HTMLResponse)
-def register(request: Request):
-    return templates.TemplateResponse("sign_in/sign_in.html", {"request": request})
+async def register(request: Request):
+    return await templates.render("sign_in/sign_in.html", {"request": request})
 
 # для создания нового пользователя
 # Функция регистрации пользователя
@@ -61,19 +57,20 @@ async def sign_in(
     await form.load_data()
 
     if await form.is_valid():
-        hashed_password = pwd_context.hash(form.password1) 
+        hashed_password = await hash_password(form.password1)  # хеширование в пуле потоков
         user = User(
-            username=form.username, email=form.email, birthdate=form.birthdate, password=hashed_password
+            username=form.username, email=form.email, birthday=form.birthdate, password=hashed_password
         )
         try:
             db.add(user)
             await db.commit()  
             await db.refresh(user) 
+            request.session['user_id'] = user.id  # заказы пользователя связываются с ним (user_store)
             form.__dict__.get("errors").append("Регистрация прошла успешно") 
-            return templates.TemplateResponse("store/primary.html", form.__dict__)
+            return await templates.render("store/primary.html", form.__dict__)
         except IntegrityError:
             form.__dict__.get("errors").append("Такой пользователь уже существует")
-            return templates.TemplateResponse("sign_in/sign_in.html", form.__dict__)
+            return await templates.render("sign_in/sign_in.html", form.__dict__)
     
-    return templates.TemplateResponse("sign_in/sign_in.html", form.__dict__)
+    return await templates.render("sign_in/sign_in.html", form.__dict__)
     
\ No newline at end of file
@@ -1,42 +1,45 @@
 import os
 import sys
 from fastapi import APIRouter, Depends, Path, Query, Request, status, HTTPException
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy import func
+from fastapi.responses import HTMLResponse, StreamingResponse
 # Сессия БД
 from sqlalchemy.ext.asyncio import AsyncSession
 # Аннотации, Модели БД и Pydantic.
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 # Функции работы с записями.
 from sqlalchemy import select
 
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from backend.cache import cache_page
+from backend.cart import cart_lines, cart_store, get_cart_id
 from backend.db_depends import get_db
-from models.store import Store
+from backend.export import stream_csv, stream_ndjson
+from backend.orders import OutOfStock, place_order
+from backend.pagination import count_cache, keyset_page, row_cursor
+from backend.product_cache import product_cache
+from backend.templates import templates
+from models.store import OrderLine, Store
 from schemas.schemas import *
 
-templates = Jinja2Templates(directory="app/templates")
 
 router = APIRouter(prefix="/store", tags=["store"])
 
 
 # функция отображает магазин с пагинацией
+# page - классическая постраничная навигация, after/before - курсорная (keyset) по Store.id,
+# которая не зависит от глубины страницы
 @router.get("/", response_class=HTMLResponse, name="store")
+@cache_page("store")
 async def store(request: Request,
                 db: Annotated[AsyncSession, Depends(get_db)],
-                page: int = 1,
-                size: int = Query(10, gt=0)):  
+                page: int = Query(1, gt=0),
+                size: int = Query(10, gt=0),
+                after: Optional[str] = None,
+                before: Optional[str] = None):  
     
-    offset = (page - 1) * size
-    
-    # Получаем общее количество продуктов
-    total_products = await db.scalar(select(func.count()).select_from(Store))
-
-    # Получаем продукты с учетом пагинации
-    result = await db.scalars(select(Store).limit(size).offset(offset))
-    products = result.all()
+    # Общее количество продуктов берется из кэша, а не считается на каждый запрос
+    total_products = await count_cache.get(db, "store", select(Store.id).where(Store.deleted_at.is_(None)))
 
     context_1 = {
             "request": request,
@@ -48,11 +51,37 @@ async def store(request: Request,
             "has_next": False,
         }
     # Если нет продуктов, возвращаем пустой список
-    if total_products == 0 or not products:
-        return templates.TemplateResponse("store/store.html", context_1)
-    
+    if total_products == 0:
+        return await templates.render("store/store.html", context_1)
+
     # Вычисляем общее количество страниц
     total_pages = (total_products // size) + (1 if total_products % size > 0 else 0)
+
+    if after is not None or before is not None:
+        # Курсорный режим: страница находится поиском по индексу первичного ключа
+        products, next_cursor, prev_cursor = await keyset_page(
+            db, select(Store).where(Store.deleted_at.is_(None)), [Store.id], size, after=after, before=before)
+        if not products:
+            return await templates.render("store/store.html", context_1)
+        return await templates.render("store/store.html", {
+            "request": request,
+            "products": products,
+            "total_pages": total_pages,
+            "items_per_page": size,
+            "has_previous": prev_cursor is not None,
+            "has_next": next_cursor is not None,
+            "previous_cursor": prev_cursor,
+            "next_cursor": next_cursor,
+        })
+
+    offset = (page - 1) * size
+
+    # Получаем продукты с учетом пагинации
+    result = await db.scalars(select(Store).where(Store.deleted_at.is_(None)).order_by(Store.id).limit(size).offset(offset))
+    products = result.all()
+
+    if not products:
+        return await templates.render("store/store.html", context_1)
     
     context_2 = {
         "request": request,
@@ -64,73 +93,152 @@ async def store(request: Request,
         "previous_page_number": page - 1 if page > 1 else None,
         "has_next": page < total_pages,
         "next_page_number": page + 1 if page < total_pages else None,
+        # ссылки на соседние страницы - курсорные, дальше страница ищется по индексу, а не через OFFSET
+        "previous_cursor": row_cursor(products[0], [Store.id]) if page > 1 else None,
+        "next_cursor": row_cursor(products[-1], [Store.id]) if page < total_pages else None,
     }
 
-    return templates.TemplateResponse("store/store.html", context_2)
+    return await templates.render("store/store.html", context_2)
 
 
-# функция отображает базу данных товаров 
+# функция отображает базу данных товаров постранично (курсорная пагинация по Store.id)
 @router.get("/database", response_model=List[StoreResponse], name="store:database")
+@cache_page("store")
 async def database(request: Request,
-                db: Annotated[AsyncSession, Depends(get_db)]):
+                db: Annotated[AsyncSession, Depends(get_db)],
+                size: int = Query(100, gt=0, le=1000),
+                after: Optional[str] = None,
+                before: Optional[str] = None):
     
-    result = await db.execute(select(Store))
-    result = result.scalars()
-    products = result.all()
+    products, next_cursor, prev_cursor = await keyset_page(
+        db, select(Store).where(Store.deleted_at.is_(None)), [Store.id], size, after=after, before=before)
 
     if not products:
-        return templates.TemplateResponse("store/database.html", {"request": request, "products": []})
+        return await templates.render("store/database.html", {"request": request, "products": []})
     
-    return templates.TemplateResponse("store/database.html", {"request": request, "products": products})
+    return await templates.render("store/database.html", {
+        "request": request,
+        "products": products,
+        "items_per_page": size,
+        "has_previous": prev_cursor is not None,
+        "has_next": next_cursor is not None,
+        "previous_cursor": prev_cursor,
+        "next_cursor": next_cursor,
+    })
+
+
+# колонки для выгрузки базы товаров
+EXPORT_COLUMNS = (Store.id, Store.title, Store.size, Store.description, Store.cost, Store.photo)
+
+
+# потоковая выгрузка базы товаров в CSV
+@router.get("/database/export.csv", name="store:export_csv")
+async def export_csv():
+    return StreamingResponse(
+        stream_csv(select(*EXPORT_COLUMNS).where(Store.deleted_at.is_(None)).order_by(Store.id)),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="store.csv"'},
+    )
+
+
+# потоковая выгрузка базы товаров в NDJSON (один JSON-объект на строку)
+@router.get("/database/export.ndjson", name="store:export_ndjson")
+async def export_ndjson():
+    return StreamingResponse(
+        stream_ndjson(select(*EXPORT_COLUMNS).where(Store.deleted_at.is_(None)).order_by(Store.id)),
+        media_type="application/x-ndjson",
+    )
     
 
 # функция отображает корзину
 @router.get("/cart", response_model=List[StoreResponse], name="store:cart")
 async def cart(request: Request,
                 db: Annotated[AsyncSession, Depends(get_db)]):
-    cart_ids = request.session.get('cart', [])
-    result = await db.scalars(select(Store).where(Store.id.in_(cart_ids)))
-    products = result.all()
-    total_cost = sum(product.cost for product in products)
+    lines, total_cost = await cart_lines(db, get_cart_id(request))
 
-    if not products:
-        return templates.TemplateResponse("store/cart.html", {
+    if not lines:
+        return await templates.render("store/cart.html", {
             "request": request,
-            "products": [],
+            "lines": [],
             "total_cost": 0
         })
     
-    return templates.TemplateResponse("store/cart.html", {"request": request, "products": products, "total_cost":total_cost})
+    return await templates.render("store/cart.html", {"request": request, "lines": lines, "total_cost": total_cost})
     
 
 
 # функции для покупки товара
 @router.post("/cart/{product_id}", name='buy_product')
 async def buy_product(request: Request, 
-                      product_id: Annotated[int, Path(ge=1, le=100, description="Enter id", example=15)],
-                      db: Annotated[AsyncSession, Depends(get_db)],):
-    # Получаем продукт из базы данных
-    product = await db.scalar(select(Store).where(Store.id == product_id))
-    if not product:
+                      product_id: Annotated[int, Path(ge=1, description="Enter id", example=15)],
+                      db: Annotated[AsyncSession, Depends(get_db)],
+                      quantity: Annotated[int, Query(ge=1, le=1000)] = 1):
+    # Проверяем, что продукт есть в базе данных (через кэш товаров)
+    product_exists = await product_cache.get(db, product_id)
+    if not product_exists:
         raise HTTPException(status_code=404, detail="Product not found")
-    # Если корзина еще не создана, создаем ее
-    if 'cart' not in request.session:
-        request.session['cart'] = []
-    # Добавляем продукт в корзину
-    if product.id not in request.session['cart']:
-        request.session['cart'].append(product.id)
-        request.session.modified = True
+    # Добавляем продукт в корзину (количество увеличивается, если товар уже в корзине)
+    await cart_store.add(db, get_cart_id(request), product_id, quantity)
     
-    return {"message": "Product added to cart", "cart": request.session['cart']}
+    return {"message": "Product added to cart", "product_id": product_id, "quantity": quantity}
 
 
-# функции для очистки корзины
-@router.post("/cart")
-async def clear_cart(request: Request):
-    # Очищаем корзину
-    request.session['cart'] = []
-    request.session.modified = True
-    return templates.TemplateResponse("store/cart.html", {"message": "Cart cleared successfully."})
-
+# функция удаления товара из корзины
+@router.post("/cart/{product_id}/remove", name='remove_product')
+async def remove_product(request: Request,
+                         product_id: int,
+                         db: Annotated[AsyncSession, Depends(get_db)]):
+    await cart_store.remove(db, get_cart_id(request), product_id)
+    return {"message": "Product removed from cart", "product_id": product_id}
 
 
+# функции для очистки корзины
+@router.post("/cart", name='clear_cart')
+async def clear_cart(request: Request,
+                     db: Annotated[AsyncSession, Depends(get_db)]):
+    # Очищаем корзину
+    await cart_store.clear(db, get_cart_id(request))
+    return await templates.render("store/cart.html", {
+        "request": request,
+        "lines": [],
+        "total_cost": 0,
+        "message": "Cart cleared successfully."
+    })
+
+
+# оформление заказа: остатки списываются атомарно, корзина очищается в той же транзакции (backend/orders.py)
+@router.post("/checkout", response_class=HTMLResponse, name="checkout")
+async def checkout(request: Request,
+                   db: Annotated[AsyncSession, Depends(get_db)]):
+    cart_id = get_cart_id(request)
+    try:
+        order = await place_order(db, cart_id, request.session.get('user_id'))
+    except OutOfStock as e:
+        lines, total_cost = await cart_lines(db, cart_id)
+        messages = []
+        if e.product_ids:
+            messages.append("Недостаточно товара на складе, уменьшите количество или удалите отмеченные товары.")
+        if e.removed_ids:
+            messages.append("Товары, снятые с продажи, удалены из корзины.")
+        return await templates.render("store/cart.html", {
+            "request": request,
+            "lines": lines,
+            "total_cost": total_cost,
+            "unavailable": e.product_ids,
+            "message": " ".join(messages),
+        }, status_code=status.HTTP_409_CONFLICT)
+
+    if order is None:
+        return await templates.render("store/cart.html", {
+            "request": request,
+            "lines": [],
+            "total_cost": 0,
+            "message": "Корзина пуста.",
+        }, status_code=status.HTTP_400_BAD_REQUEST)
+
+    result = await db.execute(
+        select(OrderLine.quantity, OrderLine.price, Store.id, Store.title)
+        .join(Store, Store.id == OrderLine.store_id)
+        .where(OrderLine.order_id == order.id)
+        .order_by(Store.id))
+    return await templates.render("store/order.html", {"request": request, "order": order, "lines": result.all()})
@@ -0,0 +1,81 @@
+'''Схемы ответов JSON API (/api/v1).
+Поля совпадают с колонками запроса: ответ собирается прямо из строк результата (backend/serialization.py),
+поэтому все поля, кроме id, могут отсутствовать в выборке (?fields=) и объявлены без обязательности.'''
+
+import os
+import sys
+from datetime import datetime
+from typing import Annotated, Generic, List, Optional, TypeVar
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.tags import parse_tags
+
+
+T = TypeVar('T')
+
+
+# Страница списка: записи и курсоры соседних страниц (передаются в after / before)
+class ApiPage(BaseModel, Generic[T]):
+    items: List[T]
+    next: Optional[str] = None
+    prev: Optional[str] = None
+
+
+class ApiCart(BaseModel, Generic[T]):
+    items: List[T]
+    total_cost: int
+
+
+class ProductItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: Optional[str] = None
+    size: Optional[float] = None
+    description: Optional[str] = None
+    cost: Optional[int] = None
+    photo: Optional[str] = None
+    stock: Optional[int] = None
+
+
+class CartLineItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    product_id: int
+    title: Optional[str] = None
+    cost: Optional[int] = None
+    quantity: int
+
+
+class PostItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: Optional[str] = None
+    slug: Optional[str] = None
+    publish: Optional[datetime] = None
+    image: Optional[str] = None
+    tags: Annotated[List[str], BeforeValidator(parse_tags)] = []  # в базе - строка через запятую
+    comment_count: Optional[int] = None
+    last_comment_at: Optional[datetime] = None
+    excerpt: Optional[str] = None  # начало текста для списков
+    body: Optional[str] = None
+
+
+class CommentItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    post_id: Optional[int] = None
+    name: Optional[str] = None
+    body: Optional[str] = None
+    created: Optional[datetime] = None
+
+
+# Новый комментарий (тело POST /api/v1/posts/{post_id}/comments)
+class CommentCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=80)
+    email: str = Field(pattern=r'^[^@\s]+@[^@\s]+$')
+    body: str = Field(min_length=1)
@@ -1,9 +1,7 @@
 from datetime import date, datetime
 from typing import List, Optional
 from fastapi import Request
-from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class UserCreateForm():
     def __init__(self, request:Request):
@@ -23,15 +21,6 @@ class UserCreateForm():
         self.password1 = form.get('password1')
         self.password2 = form.get('password2')
 
-    
-    # функции хеширования пароля
-    def set_password(self, password: str):
-        self.password = pwd_context.hash(password)
-
-    def verify_password(self, password: str):
-        return pwd_context.verify(password, self.password)
-
-        
     async def is_valid(self):
         if not self.username or not len(self.username) > 5:
             self.errors.append('Имя должно быть более 5 символов')
@@ -43,6 +32,7 @@ class UserCreateForm():
             self.errors.append('Создайте пароль от 6 символов')
         if self.password1 != self.password2:
             self.errors.append('Пароли не совпадают')
+        return not self.errors
 
 
             
@@ -88,3 +88,15 @@ class PostResponse(BaseModel):
     class Config:
         from_attributes = True
 
+
+# Строка файла массового импорта товаров (CSV/NDJSON)
+class StoreImportRow(BaseModel):
+    title: str = Field(min_length=1)
+    size: float
+    description: str = ''
+    cost: int = Field(ge=0)
+    photo: str = ''
+    stock: int = Field(0, ge=0)
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,339 @@
+'''Нагрузочные замеры основных маршрутов.
+Скрипт наполняет базу SQLite заданным объемом данных (товары, посты с комментариями, пользователи)
+и гоняет настоящее приложение app.main:app:
+- asgi - внутри процесса через httpx.ASGITransport (без сети, видна стоимость самого приложения);
+- uvicorn - отдельный процесс uvicorn и HTTP-клиент с заданным числом параллельных запросов.
+Для каждого маршрута и уровня параллельности выводятся пропускная способность (запросов в секунду)
+и процентили задержки p50/p90/p99, результаты сохраняются в JSON.
+Сравнение с прошлым прогоном (--compare) завершается с ошибкой, если p99 вырос больше чем на --threshold.
+Запуск:
+    python scripts/benchmark.py --store-rows 10000 --concurrency 1,10,50 --output bench.json
+    python scripts/benchmark.py --store-rows 1000000 --database bench.db --mode uvicorn --compare bench.json
+База по умолчанию временная. Если --database указывает на уже наполненную базу, наполнение пропускается.'''
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'app'))
+
+
+SEED_BATCH_SIZE = 10000
+CART_LINES = 10  # строк в корзине для сценария cart
+POSTS_START = datetime(2024, 1, 1)
+TAGS = ['космос', 'марс', 'ракеты', 'луна', 'спутники', 'астрономия', 'телескопы', 'мкс']
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Нагрузочные замеры основных маршрутов')
+    parser.add_argument('--store-rows', type=int, default=10000, help='число товаров (например 10000, 100000, 1000000)')
+    parser.add_argument('--posts', type=int, default=1000, help='число постов')
+    parser.add_argument('--comments-per-post', type=int, default=5, help='комментариев на пост')
+    parser.add_argument('--users', type=int, default=1000, help='число пользователей')
+    parser.add_argument('--database', help='файл базы SQLite (по умолчанию временный)')
+    parser.add_argument('--mode', choices=['asgi', 'uvicorn', 'both'], default='asgi')
+    parser.add_argument('--concurrency', default='1,10,50', help='уровни параллельности через запятую')
+    parser.add_argument('--requests', type=int, default=200, help='запросов на маршрут и уровень параллельности')
+    parser.add_argument('--warmup', type=int, default=10, help='запросов на прогрев перед замером')
+    parser.add_argument('--scenarios', default='', help='маршруты через запятую (по умолчанию все)')
+    parser.add_argument('--no-page-cache', action='store_true', help='отключить кэш страниц')
+    parser.add_argument('--port', type=int, default=0, help='порт uvicorn (0 - любой свободный)')
+    parser.add_argument('--output', default='', help='файл для результатов в JSON')
+    parser.add_argument('--compare', default='', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.2, help='допустимый рост p99 при сравнении (0.2 = 20%%)')
+    return parser.parse_args(argv)
+
+
+'''Наполнение базы. Строки вставляются пачками через executemany (один INSERT на пачку),
+пароль хешируется один раз и используется для всех пользователей - bcrypt на миллион строк занял бы часы.'''
+
+async def seed(args) -> bool:
+    from sqlalchemy import func, insert, select
+    from backend.db import SessionLocal
+    from backend.passwords import hash_password
+    from models.posts import Comment, Post, PostTag, Tag
+    from models.sign_in import User
+    from models.store import Store
+
+    async with SessionLocal() as db:
+        if await db.scalar(select(func.count()).select_from(Store)):
+            return False
+
+        async def insert_batches(model, rows):
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= SEED_BATCH_SIZE:
+                    await db.execute(insert(model), batch)
+                    await db.commit()
+                    batch = []
+            if batch:
+                await db.execute(insert(model), batch)
+                await db.commit()
+
+        await insert_batches(Store, ({'title': f'product {i}', 'size': 1.0 + i % 10, 'cost': 100 + i % 1000,
+                                      'description': f'rocket model {i}', 'photo': 'photo.jpg'}
+                                     for i in range(args.store_rows)))
+        await insert_batches(Tag, ({'id': i + 1, 'name': name} for i, name in enumerate(TAGS)))
+        await insert_batches(Post, ({'id': i + 1, 'title': f'post {i + 1}', 'slug': f'post-{i + 1}',
+                                     'body': 'космос марс ракеты ' * 100, 'published': True,
+                                     'tags': f'{TAGS[i % len(TAGS)]}, {TAGS[(i + 1) % len(TAGS)]}',
+                                     'publish': post_publish(i + 1),
+                                     'comment_count': args.comments_per_post,
+                                     'last_comment_at': post_publish(i + 1) if args.comments_per_post else None}
+                                    for i in range(args.posts)))
+        await insert_batches(PostTag, ({'post_id': i + 1, 'tag_id': (i + shift) % len(TAGS) + 1}
+                                       for i in range(args.posts) for shift in (0, 1)))
+        await insert_batches(Comment, ({'post_id': i + 1, 'name': 'reader', 'email': 'reader@example.com',
+                                        'body': f'comment {j}', 'active': True, 'created': post_publish(i + 1)}
+                                       for i in range(args.posts) for j in range(args.comments_per_post)))
+        password = await hash_password('benchmark-password')
+        await insert_batches(User, ({'username': f'user{i}', 'email': f'user{i}@example.com',
+                                     'birthday': '2000-01-01', 'password': password}
+                                    for i in range(args.users)))
+    return True
+
+
+def post_publish(post_id: int) -> datetime:
+    return POSTS_START + timedelta(hours=post_id)
+
+
+class Scenario:
+    '''Маршрут для замера: request(i) возвращает (метод, адрес, данные формы) для i-го запроса.'''
+
+    def __init__(self, name: str, request: Callable[[int], Tuple[str, str, Optional[dict]]], prepare=None):
+        self.name = name
+        self.request = request
+        self.prepare = prepare  # подготовка клиента перед замером (например, наполнить корзину)
+
+
+def build_scenarios(args) -> List[Scenario]:
+    run = datetime.now().strftime('%H%M%S')  # уникальные имена при повторных прогонах на одной базе
+    detail_posts = max(1, min(args.posts, 100))
+
+    def post_detail(i):
+        post_id = i % detail_posts + 1
+        publish = post_publish(post_id)
+        return 'GET', f'/posts/{publish.year}/{publish.month}/{publish.day}/post-{post_id}', None
+
+    # товары по всему диапазону наполненного каталога, а не только первые id
+    cart_size = max(1, min(args.store_rows, CART_LINES))
+    cart_products = sorted({1 + k * (args.store_rows - 1) // max(1, cart_size - 1) for k in range(cart_size)})
+
+    async def fill_cart(client):
+        for product_id in cart_products:
+            await client.post(f'/store/cart/{product_id}')
+
+    scenarios = [
+        Scenario('store', lambda i: ('GET', '/store/', None)),
+        Scenario('cart', lambda i: ('GET', '/store/cart', None), prepare=fill_cart),
+        Scenario('posts', lambda i: ('GET', '/posts/', None)),
+        Scenario('post_detail', post_detail),
+        Scenario('sign_up', lambda i: ('POST', '/sign_in/', {
+            'username': f'bench{run}_{i}', 'email': f'bench{run}_{i}@example.com', 'birthdate': '2000-01-01',
+            'password1': 'benchmark-password', 'password2': 'benchmark-password'})),
+        Scenario('admin_store_create', lambda i: ('POST', '/admin/store_create', {
+            'title': f'bench product {run}-{i}', 'size': '1', 'description': 'benchmark', 'cost': '100',
+            'photo': 'photo.jpg'})),
+        Scenario('admin_create_post', lambda i: ('POST', '/admin/create_post', {
+            'title': f'bench post {run}-{i}', 'slug': '1', 'body': 'benchmark', 'status': '1',
+            'image': 'photo.jpg', 'tags': 'космос, марс'})),
+    ]
+    if args.scenarios:
+        selected = args.scenarios.split(',')
+        scenarios = [scenario for scenario in scenarios if scenario.name in selected]
+    return scenarios
+
+
+# Процентиль по отсортированному списку (метод ближайшего ранга)
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+'''Замер одного маршрута: concurrency корутин по очереди забирают номера запросов из общего счетчика,
+пока не будет выполнено requests запросов. Запрос с кодом ответа >= 400 или исключением считается ошибкой.'''
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, numbers, requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            method, url, data = scenario.request(next(numbers))
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, data=data)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'scenario': scenario.name,
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': errors,
+        'rps': round(requests / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+async def run_all(client: httpx.AsyncClient, mode: str, args) -> List[dict]:
+    results = []
+    levels = [int(level) for level in args.concurrency.split(',')]
+    for scenario in build_scenarios(args):
+        numbers = itertools.count()
+        if scenario.prepare is not None:
+            await scenario.prepare(client)
+        if args.warmup:
+            await run_scenario(client, scenario, numbers, args.warmup, 1)
+        for concurrency in levels:
+            result = dict(mode=mode, **await run_scenario(client, scenario, numbers, args.requests, concurrency))
+            print_result(result)
+            results.append(result)
+    return results
+
+
+def print_result(result: dict) -> None:
+    print(f"{result['mode']:8} {result['scenario']:20} c={result['concurrency']:<4} "
+          f"{result['rps']:>9.1f} rps  p50 {result['p50_ms']:>8.2f} мс  p90 {result['p90_ms']:>8.2f} мс  "
+          f"p99 {result['p99_ms']:>8.2f} мс  ошибок {result['errors']}")
+
+
+async def run_asgi(app, args) -> List[dict]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+        return await run_all(client, 'asgi', args)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# uvicorn в отдельном процессе на уже подготовленной базе (схема и данные не пересоздаются)
+async def run_uvicorn(args) -> List[dict]:
+    port = args.port or free_port()
+    env = dict(os.environ, DB_RESET_ON_STARTUP='0')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=ROOT, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        limits = httpx.Limits(max_connections=max(int(level) for level in args.concurrency.split(',')))
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            for _ in range(100):
+                try:
+                    await client.get('/')
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError(f'uvicorn не запустился на {base_url}')
+            return await run_all(client, 'uvicorn', args)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+# Сравнение с прошлым прогоном: список маршрутов, у которых p99 вырос больше допустимого
+def compare(results: List[dict], baseline_file: str, threshold: float) -> List[str]:
+    with open(baseline_file, encoding='utf-8') as file:
+        baseline = {(row['mode'], row['scenario'], row['concurrency']): row for row in json.load(file)['results']}
+    regressions = []
+    print(f'\nСравнение с {baseline_file}:')
+    for result in results:
+        key = (result['mode'], result['scenario'], result['concurrency'])
+        old = baseline.get(key)
+        if old is None:
+            continue
+        change = (result['p99_ms'] - old['p99_ms']) / old['p99_ms'] if old['p99_ms'] else 0.0
+        marker = 'ХУЖЕ' if change > threshold else 'ok  '
+        print(f"{marker} {key[0]:8} {key[1]:20} c={key[2]:<4} rps {old['rps']:.1f} -> {result['rps']:.1f}, "
+              f"p99 {old['p99_ms']:.2f} -> {result['p99_ms']:.2f} мс ({change:+.0%})")
+        if change > threshold:
+            regressions.append(f'{key[0]} {key[1]} c={key[2]}')
+    return regressions
+
+
+async def main(args) -> int:
+    # пути пользователя - относительно текущей папки, до перехода в корень репозитория
+    args.output = os.path.abspath(args.output) if args.output else ''
+    args.compare = os.path.abspath(args.compare) if args.compare else ''
+
+    # адрес базы и настройки читаются при импорте приложения
+    temporary = not args.database
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix='benchmark_'), 'benchmark.db')
+    os.environ['DATABASE_URL'] = f'sqlite+aiosqlite:///{os.path.abspath(database)}'
+    os.environ['DB_RESET_ON_STARTUP'] = '1' if temporary else '0'
+    os.environ['SCHEMA_CACHE_FILE'] = os.path.abspath(database) + '.schema_head.json'
+    if args.no_page_cache:
+        os.environ['PAGE_CACHE_TTL'] = '0'
+    os.chdir(ROOT)  # шаблоны и статика подключаются по путям от корня репозитория
+
+    from app.main import app
+
+    results = []
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        if await seed(args):
+            print(f'База наполнена за {time.perf_counter() - started:.1f} с: {database}')
+        if args.mode in ('asgi', 'both'):
+            results += await run_asgi(app, args)
+    if args.mode in ('uvicorn', 'both'):
+        os.environ['DB_RESET_ON_STARTUP'] = '0'
+        results += await run_uvicorn(args)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'volumes': {'store_rows': args.store_rows, 'posts': args.posts,
+                    'comments_per_post': args.comments_per_post, 'users': args.users},
+        'page_cache': not args.no_page_cache,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f'Результаты сохранены в {args.output}')
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print('Регрессия p99:', ', '.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,148 @@
+'''Проверка фоновых задач и отправки писем на локальном SMTP-сервере (нужен пакет aiosmtpd).
+- "Поделиться статьей" отвечает, не дожидаясь SMTP, а письмо приходит на локальный сервер из фоновой задачи;
+- пока SMTP-сервер выключен, отправка повторяется с задержкой и проходит после его запуска;
+- задача, которая падает первые попытки, в итоге выполняется; задача, которая падает всегда,
+  после JOB_MAX_ATTEMPTS попыток становится "мертвой" (dead) с текстом ошибки.
+Если что-то не так, скрипт завершается с ошибкой.
+Запуск:
+    pip install aiosmtpd
+    python scripts/jobs_check.py'''
+
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+
+# временная база, локальный SMTP и короткие задержки - до импорта приложения, настройки читаются при импорте
+_tmp_dir = tempfile.mkdtemp(prefix='jobs_check_')
+with socket.socket() as _socket:
+    _socket.bind(('127.0.0.1', 0))
+    SMTP_PORT = _socket.getsockname()[1]
+os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(_tmp_dir, 'jobs.db')}"
+os.environ['DB_RESET_ON_STARTUP'] = '1'
+os.environ['SCHEMA_CACHE_FILE'] = os.path.join(_tmp_dir, 'schema_head.json')
+os.environ['MAIL_SERVER'] = '127.0.0.1'
+os.environ['MAIL_PORT'] = str(SMTP_PORT)
+os.environ['MAIL_TIMEOUT'] = '2'
+os.environ['JOB_POLL_INTERVAL'] = '0.05'
+os.environ['JOB_RETRY_DELAY'] = '0.1'
+os.environ['JOB_MAX_ATTEMPTS'] = '3'
+
+import httpx
+from aiosmtpd.controller import Controller
+from sqlalchemy import select
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+from app.main import app
+from backend.db import SessionLocal
+from backend.jobs import enqueue, job_handler
+from models.jobs import Job
+from models.posts import Post
+
+
+class Inbox:
+    '''Обработчик aiosmtpd: сохраняет полученные письма.'''
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+_flaky_calls = {'count': 0}
+
+
+@job_handler('check_flaky')
+async def flaky(payload: dict) -> None:
+    _flaky_calls['count'] += 1
+    if _flaky_calls['count'] < payload['succeed_on']:
+        raise RuntimeError(f"попытка {_flaky_calls['count']} не удалась")
+
+
+@job_handler('check_broken')
+async def broken(payload: dict) -> None:
+    raise RuntimeError('обработчик всегда падает')
+
+
+async def wait_job(job_id: int, statuses=('done', 'dead'), timeout: float = 15.0) -> Job:
+    deadline = time.monotonic() + timeout
+    while True:
+        async with SessionLocal() as db:
+            job = await db.scalar(select(Job).where(Job.id == job_id))
+        if job.status in statuses or time.monotonic() > deadline:
+            return job
+        await asyncio.sleep(0.05)
+
+
+async def check() -> list:
+    problems = []
+    inbox = Inbox()
+    smtp = Controller(inbox, hostname='127.0.0.1', port=SMTP_PORT)
+    smtp.start()
+    try:
+        async with app.router.lifespan_context(app):
+            async with SessionLocal() as db:
+                db.add(Post(title='Mars', slug='mars', body='red planet', published=True, tags='mars'))
+                await db.commit()
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                started = time.perf_counter()
+                response = await client.post('/posts/share/1', data={
+                    'name': 'Reader', 'email': 'reader@example.com', 'to': 'friend@example.com', 'comments': 'look'})
+                seconds = time.perf_counter() - started
+            print(f'POST /posts/share/1: HTTP {response.status_code} за {seconds * 1000:.1f} мс')
+            if response.status_code != 200:
+                problems.append(f'поделиться статьей: HTTP {response.status_code}')
+
+            async with SessionLocal() as db:
+                share_job = await db.scalar(select(Job.id).where(Job.kind == 'send_email'))
+            job = await wait_job(share_job)
+            received = [m for m in inbox.messages if 'friend@example.com' in m.rcpt_tos]
+            print(f'письмо: задача {job.status}, попыток {job.attempts}, получено писем {len(received)}')
+            if job.status != 'done' or not received or b'Mars' not in received[0].content:
+                problems.append(f'письмо не доставлено: {job.status} {job.last_error}')
+
+            # SMTP-сервер недоступен: задача повторяется и выполняется после его запуска
+            smtp.stop()
+            async with SessionLocal() as db:
+                retry_job = await enqueue(db, 'send_email', {
+                    'recipients': ['later@example.com'], 'subject': 'retry', 'body': 'retry'}, max_attempts=10)
+            job = await wait_job(retry_job, statuses=('pending',), timeout=5)
+            while job.attempts < 2 and job.status == 'pending':
+                job = await wait_job(retry_job, statuses=(), timeout=0.2)
+            smtp = Controller(inbox, hostname='127.0.0.1', port=SMTP_PORT)
+            smtp.start()
+            job = await wait_job(retry_job)
+            print(f'SMTP был недоступен: задача {job.status}, попыток {job.attempts}')
+            if job.status != 'done' or job.attempts < 2 or not any('later@example.com' in m.rcpt_tos for m in inbox.messages):
+                problems.append(f'повтор после недоступности SMTP: {job.status}, попыток {job.attempts}')
+
+            async with SessionLocal() as db:
+                flaky_job = await enqueue(db, 'check_flaky', {'succeed_on': 3})
+                broken_job = await enqueue(db, 'check_broken', {})
+            job = await wait_job(flaky_job)
+            print(f'падает 2 раза: задача {job.status}, попыток {job.attempts}')
+            if job.status != 'done' or job.attempts != 3:
+                problems.append(f'повторы: {job.status}, попыток {job.attempts}')
+            job = await wait_job(broken_job)
+            print(f'падает всегда: задача {job.status}, попыток {job.attempts}, ошибка: {job.last_error}')
+            if job.status != 'dead' or job.attempts != 3 or not job.last_error:
+                problems.append(f'мертвая задача: {job.status}, попыток {job.attempts}')
+    finally:
+        smtp.stop()
+    return problems
+
+
+if __name__ == '__main__':
+    problems = asyncio.run(check())
+    for problem in problems:
+        print('ERR', problem)
+    if not problems:
+        print('OK  письма отправляются фоновыми задачами, повторы и мертвые задачи работают')
+    sys.exit(1 if problems else 0)
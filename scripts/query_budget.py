@@ -0,0 +1,101 @@
+'''Проверка бюджета SQL-запросов на страницу (защита от N+1).
+Скрипт создает временную базу SQLite, наполняет ее небольшим набором данных, выполняет запросы
+к приложению внутри процесса (httpx + ASGITransport) и считает SQL-запросы на каждый маршрут.
+Если маршрут выполнил больше запросов, чем указано в ROUTE_BUDGETS, скрипт завершается с ошибкой.
+Кэш страниц на время проверки отключается, чтобы считались запросы "холодной" страницы.
+Запуск:
+    python scripts/query_budget.py'''
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# временная база и чистая схема - до импорта приложения, настройки читаются при импорте
+_tmp_dir = tempfile.mkdtemp(prefix='query_budget_')
+os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(_tmp_dir, 'budget.db')}"
+os.environ['DB_RESET_ON_STARTUP'] = '1'
+os.environ['SCHEMA_CACHE_FILE'] = os.path.join(_tmp_dir, 'schema_head.json')
+os.environ['JOBS_ENABLED'] = '0'  # запросы воркеров фоновых задач не должны попадать в счетчик маршрута
+
+from datetime import datetime
+
+import httpx
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+from app.main import app
+from backend.cache import page_cache
+from backend.comment_stats import reconcile_comment_stats
+from backend.db import SessionLocal
+from backend.query_counter import count_queries
+from backend.tags import set_post_tags
+from models.posts import Comment, Post
+from models.store import Store
+
+
+# (метод, адрес, максимальное число SQL-запросов)
+ROUTE_BUDGETS = [
+    ('GET', '/', 0),
+    ('GET', '/store/', 2),
+    ('GET', '/store/?size=5&after=WzVd', 2),
+    ('GET', '/store/database', 1),
+    ('POST', '/store/cart/1', 2),
+    ('POST', '/store/cart/2', 2),
+    ('GET', '/store/cart', 2),
+    ('POST', '/store/checkout', 7),  # корзина + UPDATE остатка на каждую строку + заказ, строки, очистка, итог
+    ('GET', '/posts/', 2),
+    ('GET', '/posts/?sort=discussed', 2),
+    ('GET', '/posts/?sort=active&items_per_page=4&after=WyIyMTAwLTAxLTAxVDAwOjAwOjAwIiw1XQ', 2),
+    ('GET', '/posts/2024/1/1/post-0', 3),
+    ('GET', '/search/?q=mars', 2),
+    ('GET', '/api/v1/products?fields=id,title,cost', 1),
+    ('POST', '/api/v1/cart/3', 3),  # товар из кэша, добавление, состав корзины
+    ('GET', '/api/v1/cart', 1),
+    ('GET', '/api/v1/posts?sort=discussed&fields=id,title,comment_count', 1),
+    ('GET', '/api/v1/posts/1', 1),
+    ('GET', '/api/v1/posts/1/comments?size=3', 1),
+]
+
+
+async def seed() -> None:
+    async with SessionLocal() as db:
+        db.add_all([Store(title=f'product {i}', size=1.0, description='rocket', cost=100 + i, photo='photo.jpg',
+                          stock=10)
+                    for i in range(30)])
+        for i in range(10):
+            post = Post(title=f'post {i}', slug=f'post-{i}', body='mars ' * 50, published=True,
+                        tags='mars, space' if i % 2 else 'mars', publish=datetime(2024, 1, 1 + i))
+            db.add(post)
+            await db.flush()
+            await set_post_tags(db, post.id, post.tags)
+            db.add_all([Comment(post_id=post.id, name='reader', email='reader@example.com', body=f'comment {j}')
+                        for j in range(5)])
+        await db.commit()
+        await reconcile_comment_stats(db)  # счетчики комментариев постов по вставленным напрямую комментариям
+
+
+async def check_budgets() -> list:
+    page_cache.ttl = 0
+    problems = []
+    async with app.router.lifespan_context(app):
+        await seed()
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            for method, url, budget in ROUTE_BUDGETS:
+                with count_queries() as counter:
+                    response = await client.request(method, url)
+                status = 'OK ' if counter.count <= budget and response.status_code < 400 else 'ERR'
+                print(f'{status} {method} {url}: {counter.count} запросов (бюджет {budget}), HTTP {response.status_code}')
+                if status == 'ERR':
+                    problems.append((method, url, counter.count, response.status_code, counter.statements))
+    return problems
+
+
+if __name__ == '__main__':
+    problems = asyncio.run(check_budgets())
+    for method, url, count, status_code, statements in problems:
+        print(f'\n{method} {url}: {count} запросов, HTTP {status_code}')
+        for statement in statements:
+            print('   ', ' '.join(statement.split()))
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,81 @@
+'''Проверка планов запросов (EXPLAIN QUERY PLAN, SQLite).
+Здесь собраны запросы из роутеров, которые фильтруют или сортируют данные. Для каждого строится план
+на схеме из моделей, и если SQLite читает таблицу целиком (SCAN без индекса) или сортирует
+во временном B-дереве, проверка завершается ошибкой.
+Запуск:
+    python scripts/query_plan.py
+При добавлении нового запроса с фильтром в роутер добавьте его и в CHECKED_QUERIES.'''
+
+import os
+import sys
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import create_engine, select, tuple_
+from sqlalchemy.sql import Select
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+from backend.db import Base
+from models.posts import Comment, Post
+from models.sign_in import User
+from models.store import Store
+
+
+# (название, построитель запроса) - запросы повторяют соответствующие места в роутерах
+CHECKED_QUERIES: List[Tuple[str, Callable[[], Select]]] = [
+    ('posts.post_list', lambda: select(Post.id, Post.title, Post.publish)
+        .where(Post.published.is_(True))
+        .order_by(Post.publish.desc(), Post.id.desc()).limit(2)),
+    ('posts.post_list:count', lambda: select(Post.id).where(Post.published.is_(True))),
+    ('posts.post_list:cursor', lambda: select(Post.id, Post.title, Post.publish)
+        .where(Post.published.is_(True))
+        .where(tuple_(Post.publish, Post.id) < tuple_(datetime(2024, 1, 1), 1))
+        .order_by(Post.publish.desc(), Post.id.desc()).limit(3)),
+    ('posts.post_list:slug', lambda: select(Post).where(Post.slug == 'slug')),
+    ('posts.post_detail:comments', lambda: select(Comment)
+        .where(Comment.post_id == 1, Comment.active.is_(True))),
+    ('store.store:cursor', lambda: select(Store).where(Store.id > 10).order_by(Store.id).limit(11)),
+    ('store.cart', lambda: select(Store).where(Store.id.in_([1, 2, 3]))),
+    ('admin.create_store', lambda: select(Store).where(Store.title == 'title')),
+    ('admin.create_post', lambda: select(Post).where(Post.title == 'title')),
+    ('admin.create_user', lambda: select(User).where(User.username == 'username')),
+    ('sign_in.sign_in:email', lambda: select(User).where(User.email == 'email')),
+]
+
+
+# строка плана означает полный просмотр таблицы или сортировку без индекса
+def is_bad_step(detail: str) -> bool:
+    if detail.startswith('SCAN') and 'USING' not in detail:
+        return True
+    return 'USE TEMP B-TREE' in detail
+
+
+def explain(conn, query: Select) -> List[str]:
+    compiled = query.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).all()
+    return [row[-1] for row in rows]
+
+
+'''Возвращает список нарушений: (название запроса, строка плана). Пустой список - все запросы используют индексы.'''
+
+def check_query_plans(url: str = 'sqlite://') -> List[Tuple[str, str]]:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    problems = []
+    with engine.connect() as conn:
+        for name, build in CHECKED_QUERIES:
+            for detail in explain(conn, build()):
+                if is_bad_step(detail):
+                    problems.append((name, detail))
+    engine.dispose()
+    return problems
+
+
+if __name__ == '__main__':
+    problems = check_query_plans()
+    for name, detail in problems:
+        print(f'{name}: {detail}')
+    if problems:
+        sys.exit(1)
+    print(f'Все запросы используют индексы ({len(CHECKED_QUERIES)})')